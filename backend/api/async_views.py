@@ -0,0 +1,117 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connections
+from django.urls import URLPattern
+
+# Маршруты чтения, которые в режиме ASGI обслуживаются асинхронно.
+ASYNC_ROUTES = frozenset((
+    'recipes-list',
+    'recipes-detail',
+    'recipes-download-shopping-cart',
+    'recipes-shopping-cart-totals',
+    'tags-list',
+    'tags-detail',
+    'ingredients-list',
+    'ingredients-detail',
+    'recipes-export',
+))
+
+_DONE = object()
+
+
+async def iterate_in_thread(iterable):
+    """Асинхронный итератор по синхронному, который читается в потоке.
+
+    Все части читаются в одном отдельном потоке: генератор, читающий
+    курсор БД, должен работать с соединением того потока, где его открыл.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stream')
+    iterator = iter(iterable)
+    try:
+        while True:
+            part = await loop.run_in_executor(executor, next, iterator, _DONE)
+            if part is _DONE:
+                break
+            yield part
+    finally:
+        await loop.run_in_executor(executor, connections.close_all)
+        executor.shutdown(wait=False)
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGI-обработчик, который не читает потоковые ответы в цикле событий.
+
+    Django 3.2 перебирает потоковый ответ прямо в цикле событий, где
+    обращаться к БД нельзя. Здесь каждая часть ответа читается в потоке
+    и сразу отправляется клиенту, ответ не собирается целиком.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        headers = [
+            (header.encode('ascii'), value.encode('latin1'))
+            for header, value in response.items()
+        ]
+        headers += [
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        ]
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        async for part in iterate_in_thread(response):
+            for chunk, _ in self.chunk_bytes(part):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def call_in_thread(view, request, *args, **kwargs):
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Async-обёртка над синхронным DRF-представлением.
+
+    Под ASGI Django выполняет синхронные представления по очереди в
+    одном общем потоке. Обёрнутое представление выполняется в пуле
+    потоков, поэтому запросы обрабатываются параллельно, и у каждого
+    потока своё соединение с БД.
+    """
+    call = sync_to_async(call_in_thread, thread_sensitive=False)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await call(view, request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_patterns(patterns):
+    """Заменяет представления маршрутов из ASYNC_ROUTES на async."""
+    return [
+        URLPattern(pattern.pattern, async_view(pattern.callback),
+                   pattern.default_args, pattern.name)
+        if isinstance(pattern, URLPattern) and pattern.name in ASYNC_ROUTES
+        else pattern
+        for pattern in patterns
+    ]
@@ -0,0 +1,105 @@
+import random
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+
+from recipes.models import (
+    Cart, Favorite, Ingredient, IngredientAmount, Recipe, Tag
+)
+from users.models import Follow
+
+User = get_user_model()
+
+PASSWORD = 'benchmark-password'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = round(percent / 100 * (len(values) - 1))
+    return values[index]
+
+
+def create_users(count):
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([
+        User(username=f'user{number}', email=f'user{number}@foodgram.ru',
+             first_name='Имя', last_name='Фамилия', password=password)
+        for number in range(count)
+    ])
+    return list(User.objects.order_by('pk'))
+
+
+def create_recipes(count, authors, rng):
+    tags = [Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in TAGS]
+    ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+    Recipe.objects.bulk_create([
+        Recipe(author=rng.choice(authors), name=f'Рецепт {number}',
+               text='Описание рецепта', cooking_time=rng.randint(5, 120),
+               image='recipe_images/benchmark.png')
+        for number in range(count)
+    ])
+    recipes = list(Recipe.objects.values_list('pk', flat=True))
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe_id=recipe, tag_id=tag.pk)
+        for recipe in recipes
+        for tag in rng.sample(tags, rng.randint(1, len(tags)))
+    ])
+    IngredientAmount.objects.bulk_create([
+        IngredientAmount(recipe_id=recipe, ingredients_id=ingredient,
+                         amount=rng.randint(1, 500))
+        for recipe in recipes
+        for ingredient in rng.sample(ingredient_ids, rng.randint(3, 10))
+    ])
+    return recipes
+
+
+def create_relations(users, recipes, options, rng):
+    Follow.objects.bulk_create([
+        Follow(user=user, author=author)
+        for user in users
+        for author in rng.sample(users, min(options['follows'], len(users)))
+        if author != user
+    ])
+    for model, size in ((Favorite, options['favorites']),
+                        (Cart, options['cart'])):
+        model.objects.bulk_create([
+            model(user=user, recipe_id=recipe)
+            for user in users
+            for recipe in rng.sample(recipes, min(size, len(recipes)))
+        ])
+
+
+def seed(options):
+    """Заполняет тестовую базу синтетическими данными."""
+    rng = random.Random(options['seed'])
+    call_command('import_csv', stdout=StringIO())
+    users = create_users(options['users'])
+    recipes = create_recipes(options['recipes'], users, rng)
+    create_relations(users, recipes, options, rng)
+    author = User.objects.create_user(
+        username='author', email='author@foodgram.ru', password=PASSWORD)
+    recipe = Recipe.objects.create(
+        author=author, name='Рецепт автора', text='Описание',
+        cooking_time=10, image='recipe_images/benchmark.png')
+    call_command('recount', stdout=StringIO())
+    call_command('rebuild_cart_totals', stdout=StringIO())
+    call_command('build_recommendations', stdout=StringIO())
+    return {
+        'user': users[0],
+        'author': author.pk,
+        'recipe': recipe.pk,
+        'tag': Tag.objects.values_list('pk', flat=True).first(),
+        'ingredient': Ingredient.objects.values_list('pk', flat=True)[0],
+        'ingredient_id': Ingredient.objects.values_list('pk', flat=True)[1],
+        'email': author.email,
+        'batch': recipes[-20:],
+        'pantry': list(Ingredient.objects.values_list('pk', flat=True)[:30]),
+    }
@@ -0,0 +1,149 @@
+from collections import namedtuple
+from hashlib import sha1
+from threading import Lock
+from time import time
+
+from django.core.cache import cache
+from django.utils.http import quote_etag
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, Tag
+from .serializers import IngredientSerializer, TagSerializer
+
+RECIPE_CACHE_TIMEOUT = 60 * 60 * 24
+RECIPE_IMAGE_FIELDS = ('image', 'thumbnail', 'medium')
+TAG_IDS_CACHE_KEY = 'tag_ids'
+TAG_IDS_CACHE_TIMEOUT = 300
+# Без сигнала (например, после bulk_create) версия сменится сама.
+REFERENCE_VERSION_TIMEOUT = 300
+
+Reference = namedtuple(
+    'Reference', ('version', 'data', 'items', 'body', 'etag', 'modified'))
+
+
+def bump_version(key):
+    """Меняет номер версии данных, общий для всех процессов."""
+    version = time()
+    cache.set(key, version, REFERENCE_VERSION_TIMEOUT)
+    return version
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time(), REFERENCE_VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def render_json(data):
+    """JSON-представление данных и сильный ETag по его содержимому."""
+    body = JSONRenderer().render(data)
+    return body, quote_etag(sha1(body).hexdigest())
+
+
+class ReferenceCache:
+    """Сериализованный справочник в памяти процесса.
+
+    Номер версии справочника хранится в общем кэше и меняется сигналами
+    при записи. Пока версия не изменилась, каждый процесс отдаёт готовые
+    данные, JSON и ETag без обращения к БД.
+    """
+
+    def __init__(self, name, queryset, serializer_class):
+        self.version_key = f'reference_version:{name}'
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self._lock = Lock()
+        self._entry = None
+
+    def bump(self):
+        bump_version(self.version_key)
+
+    def get(self):
+        version = get_version(self.version_key)
+        entry = self._entry
+        if entry is not None and entry.version == version:
+            return entry
+        with self._lock:
+            data = self.serializer_class(self.queryset.all(), many=True).data
+            body, etag = render_json(data)
+            # Неизменившиеся данные сохраняют прежнюю дату изменения.
+            modified = (
+                entry.modified if entry is not None and entry.etag == etag
+                else version
+            )
+            self._entry = Reference(
+                version, data, {str(item['id']): item for item in data},
+                body, etag, modified,
+            )
+            return self._entry
+
+
+def get_tag_ids(slugs=()):
+    """Словарь {slug: id} всех тегов из кэша.
+
+    Если каких-то из slugs в кэше нет, словарь перечитывается из БД:
+    кэш процесса мог не узнать о теге, созданном в другом процессе.
+    """
+    tag_ids = cache.get(TAG_IDS_CACHE_KEY)
+    if tag_ids is None or not tag_ids.keys() >= set(slugs):
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(TAG_IDS_CACHE_KEY, tag_ids, TAG_IDS_CACHE_TIMEOUT)
+    return tag_ids
+
+
+def invalidate_tag_ids():
+    cache.delete(TAG_IDS_CACHE_KEY)
+
+
+tags_cache = ReferenceCache('tags', Tag.objects.all(), TagSerializer)
+ingredients_cache = ReferenceCache(
+    'ingredients', Ingredient.objects.all(), IngredientSerializer)
+
+
+def recipe_cache_key(recipe):
+    return f'recipe_data:{recipe.pk}:{recipe.updated.isoformat()}'
+
+
+def apply_user_flags(data, recipe, request):
+    """Накладывает на общие данные рецепта флаги текущего пользователя.
+
+    В кэше URL изображений хранятся без хоста, абсолютными они
+    становятся здесь, по заголовку Host текущего запроса.
+    """
+    data = {
+        **data,
+        'is_favorited': recipe.is_favorited,
+        'is_in_shopping_cart': recipe.is_in_shopping_cart,
+    }
+    for field in RECIPE_IMAGE_FIELDS:
+        if data[field]:
+            data[field] = request.build_absolute_uri(data[field])
+    if data['author'] is not None:
+        data['author'] = {
+            **data['author'], 'is_subscribed': recipe.is_subscribed
+        }
+    return data
+
+
+def get_recipes_data(recipes, serialize, request):
+    """Данные рецептов из кэша.
+
+    Общая для всех пользователей часть хранится в кэше под ключом с
+    версией рецепта (поле updated), поэтому после изменения рецепта
+    старая запись просто перестаёт использоваться. Отсутствующие в кэше
+    рецепты сериализуются вызовом serialize(pks), который должен вернуть
+    словарь {pk: данные} без привязки к запросу.
+    """
+    keys = {recipe.pk: recipe_cache_key(recipe) for recipe in recipes}
+    cached = cache.get_many(keys.values())
+    missing = [pk for pk, key in keys.items() if key not in cached]
+    if missing:
+        fresh = {keys[pk]: data for pk, data in serialize(missing).items()}
+        cache.set_many(fresh, RECIPE_CACHE_TIMEOUT)
+        cached.update(fresh)
+    return [
+        apply_user_flags(cached[keys[recipe.pk]], recipe, request)
+        for recipe in recipes if keys[recipe.pk] in cached
+    ]
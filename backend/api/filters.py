@@ -1,20 +1,54 @@
-from rest_framework.filters import SearchFilter
-from django_filters import AllValuesMultipleFilter, rest_framework
+from django.db.models import Exists, OuterRef
+from django_filters import fields, rest_framework
 from django_filters.widgets import BooleanWidget
 
 from recipes.models import Recipe
+from .cache import get_tag_ids
+from .search import search_recipes
 
 
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
+def tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
+
+class TagSlugField(fields.MultipleChoiceField):
+    """Слаги тегов, проверяемые по кэшу с обращением к БД при промахе."""
+
+    def valid_value(self, value):
+        return value in get_tag_ids([value])
+
+
+class TagSlugFilter(rest_framework.MultipleChoiceFilter):
+    field_class = TagSlugField
 
 
 class RecipeFilter(rest_framework.FilterSet):
-    is_in_shopping_cart = rest_framework.BooleanFilter(widget=BooleanWidget())
-    is_favorited = rest_framework.BooleanFilter(widget=BooleanWidget())
-    tags = AllValuesMultipleFilter(field_name='tags__slug')
-    author = AllValuesMultipleFilter(field_name='author__id')
+    is_in_shopping_cart = rest_framework.BooleanFilter(
+        widget=BooleanWidget(), method='filter_annotation')
+    is_favorited = rest_framework.BooleanFilter(
+        widget=BooleanWidget(), method='filter_annotation')
+    tags = TagSlugFilter(choices=tag_choices, method='filter_tags')
+    author = rest_framework.NumberFilter(field_name='author')
+    search = rest_framework.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ['author__id', 'tags__slug']
+        fields = ['author', 'tags', 'search']
+
+    def filter_annotation(self, queryset, name, value):
+        """Фильтр по аннотациям is_favorited/is_in_shopping_cart."""
+        if value is None:
+            return queryset
+        return queryset.filter(**{name: value})
+
+    def filter_tags(self, queryset, name, value):
+        tag_ids = get_tag_ids(value)
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'),
+                tag__in=[tag_ids[slug] for slug in value],
+            )
+        ))
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
@@ -0,0 +1,261 @@
+import json
+import os
+import tempfile
+from statistics import median
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, resolve
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.benchmarking import PASSWORD, percentile, seed
+from api.urls import router
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAA'
+    'DElEQVR4nGP4z8AAAAMBAQDJ/pLvAAAAAElFTkSuQmCC'
+)
+LATENCY_SLACK_MS = 5
+SKIPPED_ROUTES = {
+    'api-root',
+    # Массовые выгрузка и загрузка рецептов, только для администраторов.
+    'recipes-export',
+    'recipes-import',
+    'users-activation',
+    'users-resend-activation',
+    'users-reset-password',
+    'users-reset-password-confirm',
+    'users-reset-username',
+    'users-reset-username-confirm',
+    'users-set-username',
+}
+
+
+def recipe_payload(state):
+    return {
+        'ingredients': [{'id': state['ingredient'], 'amount': 100},
+                        {'id': state['ingredient_id'], 'amount': 2}],
+        'tags': [state['tag']],
+        'image': IMAGE,
+        'name': f'Новый рецепт {state["run"]}',
+        'text': 'Описание нового рецепта',
+        'cooking_time': 15,
+    }
+
+
+# (название, метод, url, данные, ключ состояния для id из ответа)
+CASES = (
+    ('tags-list', 'get', '/api/tags/', None, None),
+    ('tags-detail', 'get', '/api/tags/{tag}/', None, None),
+    ('ingredients-list', 'get', '/api/ingredients/', None, None),
+    ('ingredients-list ?name', 'get', '/api/ingredients/?name=мол',
+     None, None),
+    ('ingredients-detail', 'get', '/api/ingredients/{ingredient}/',
+     None, None),
+    ('recipes-list', 'get', '/api/recipes/', None, None),
+    ('recipes-list ?limit=50', 'get', '/api/recipes/?limit=50', None, None),
+    ('recipes-list filtered', 'get',
+     '/api/recipes/?tags=breakfast&tags=lunch&is_favorited=1', None, None),
+    ('recipes-list ?cursor', 'get', '/api/recipes/?cursor=', None, None),
+    ('recipes-detail', 'get', '/api/recipes/{recipe}/', None, None),
+    ('recipes-list POST', 'post', '/api/recipes/', recipe_payload,
+     'new_recipe'),
+    ('recipes-detail PATCH', 'patch', '/api/recipes/{new_recipe}/',
+     recipe_payload, None),
+    ('recipes-detail DELETE', 'delete', '/api/recipes/{new_recipe}/',
+     None, None),
+    ('recipes-favorite POST', 'post', '/api/recipes/{recipe}/favorite/',
+     None, None),
+    ('recipes-favorite DELETE', 'delete', '/api/recipes/{recipe}/favorite/',
+     None, None),
+    ('recipes-shopping-cart POST', 'post',
+     '/api/recipes/{recipe}/shopping_cart/', None, None),
+    ('recipes-shopping-cart DELETE', 'delete',
+     '/api/recipes/{recipe}/shopping_cart/', None, None),
+    ('recipes-favorite-batch POST', 'post', '/api/recipes/favorite/batch/',
+     lambda state: {'recipes': state['batch']}, None),
+    ('recipes-favorite-batch DELETE', 'delete',
+     '/api/recipes/favorite/batch/',
+     lambda state: {'recipes': state['batch']}, None),
+    ('recipes-shopping-cart-batch POST', 'post',
+     '/api/recipes/shopping_cart/batch/',
+     lambda state: {'recipes': state['batch']}, None),
+    ('recipes-shopping-cart-batch DELETE', 'delete',
+     '/api/recipes/shopping_cart/batch/',
+     lambda state: {'recipes': state['batch']}, None),
+    ('recipes-download-shopping-cart', 'get',
+     '/api/recipes/download_shopping_cart/', None, None),
+    ('recipes-shopping-cart-totals', 'get',
+     '/api/recipes/shopping_cart/totals/', None, None),
+    ('recipes-recommended', 'get', '/api/recipes/recommended/', None, None),
+    ('recipes-pantry POST', 'post', '/api/recipes/pantry/',
+     lambda state: {'ingredients': state['pantry']}, None),
+    ('users-list', 'get', '/api/users/', None, None),
+    ('users-list POST', 'post', '/api/users/', lambda state: {
+        'email': f'new{state["run"]}@foodgram.ru',
+        'username': f'new{state["run"]}', 'first_name': 'Имя',
+        'last_name': 'Фамилия', 'password': PASSWORD,
+    }, None),
+    ('users-detail', 'get', '/api/users/{author}/', None, None),
+    ('users-me', 'get', '/api/users/me/', None, None),
+    ('users-subscriptions', 'get',
+     '/api/users/subscriptions/?recipes_limit=3', None, None),
+    ('users-subscribe POST', 'post', '/api/users/{author}/subscribe/',
+     None, None),
+    ('users-subscribe DELETE', 'delete', '/api/users/{author}/subscribe/',
+     None, None),
+    ('users-set-password', 'post', '/api/users/set_password/',
+     {'new_password': PASSWORD, 'current_password': PASSWORD}, None),
+    ('login', 'post', '/api/auth/token/login/',
+     lambda state: {'email': state['email'], 'password': PASSWORD}, None),
+    ('logout', 'post', '/api/auth/token/logout/', None, None),
+)
+
+
+def route_names():
+    names = {pattern.name for pattern in router.urls
+             if not isinstance(pattern, URLResolver)}
+    return names | {'login', 'logout'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет тестовую базу синтетическими данными, замеряет число '
+        'SQL-запросов и задержку (p50/p95) для каждого эндпоинта API и '
+        'сравнивает результат с сохранённым эталоном.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=300)
+        parser.add_argument('--follows', type=int, default=10)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--cart', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Число замеров для каждого эндпоинта.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--baseline',
+            default=os.path.join(settings.BASE_DIR, 'api',
+                                 'benchmark_baseline.json'),
+            help='Файл с эталонными результатами.')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Сохранить результаты как эталон.')
+        parser.add_argument(
+            '--latency-tolerance', type=float, default=1.0,
+            help='Допустимый относительный рост p95 (1.0 = в два раза).')
+
+    def handle(self, *args, **options):
+        self.check_coverage()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root,
+                                      IMAGE_PROCESSING_ASYNC=False):
+                cache.clear()
+                state = seed(options)
+                results = self.run_cases(state, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.report(results)
+        if options['update_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Эталон сохранён в {options["baseline"]}')
+            return
+        self.compare(results, options)
+
+    def check_coverage(self):
+        covered = {resolve(url.split('?')[0].format(
+            tag=1, ingredient=1, recipe=1, new_recipe=1, author=1
+        )).url_name for _, _, url, _, _ in CASES}
+        missing = route_names() - covered - SKIPPED_ROUTES
+        if missing:
+            raise CommandError(
+                f'Нет замеров для маршрутов: {", ".join(sorted(missing))}')
+
+    def request(self, client, state, case):
+        _, method, url, data, store = case
+        if callable(data):
+            data = data(state)
+        if method == 'post' and url.endswith('/logout/'):
+            client.credentials(
+                HTTP_AUTHORIZATION='Token ' + state['login_token'])
+        started = perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(
+                url.format(**state), data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+        elapsed = (perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{case[0]}: код ответа {response.status_code} '
+                f'{getattr(response, "data", "")}')
+        if store:
+            state[store] = response.data['id']
+        if url.endswith('/login/'):
+            state['login_token'] = response.data['auth_token']
+        return elapsed, len(queries)
+
+    def run_cases(self, state, repeat):
+        client = APIClient()
+        token = Token.objects.create(user=state['user']).key
+        timings = {case[0]: ([], []) for case in CASES}
+        for run in range(repeat):
+            state['run'] = run
+            for case in CASES:
+                client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+                elapsed, queries = self.request(client, state, case)
+                timings[case[0]][0].append(elapsed)
+                timings[case[0]][1].append(queries)
+        return {
+            name: {
+                'queries': max(queries),
+                'p50_ms': round(median(latencies), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+            }
+            for name, (latencies, queries) in timings.items()
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"Эндпоинт":<34}{"запросы":>9}{"p50, мс":>10}{"p95, мс":>10}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<34}{result["queries"]:>9}'
+                f'{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}')
+
+    def compare(self, results, options):
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(self.style.WARNING(
+                'Эталон не найден, сравнение пропущено. '
+                'Сохраните его с --update-baseline.'))
+            return
+        with open(options['baseline'], encoding='utf-8') as file:
+            baseline = json.load(file)
+        tolerance = 1 + options['latency_tolerance']
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            if result['queries'] > expected['queries']:
+                regressions.append(
+                    f'{name}: запросов {result["queries"]} '
+                    f'(эталон {expected["queries"]})')
+            limit = expected['p95_ms'] * tolerance + LATENCY_SLACK_MS
+            if result['p95_ms'] > limit:
+                regressions.append(
+                    f'{name}: p95 {result["p95_ms"]} мс '
+                    f'(эталон {expected["p95_ms"]} мс)')
+        if regressions:
+            raise CommandError(
+                'Регрессия производительности:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий не обнаружено.'))
@@ -0,0 +1,151 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.test.utils import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.benchmarking import seed
+from api.services import get_recommended, get_shop_list
+from api.views import RecipeViewSet
+from recipes.models import Favorite, Ingredient, Recipe
+from users.models import Follow
+
+
+def recipes(state, **params):
+    """Queryset списка рецептов так, как его строит RecipeViewSet."""
+    request = Request(APIRequestFactory().get('/api/recipes/', params))
+    request.user = state['user']
+    view = RecipeViewSet(
+        request=request, format_kwarg=None, action='list', kwargs={})
+    return view.filter_queryset(view.get_queryset())
+
+
+def subscription_recipes(state):
+    authors = Follow.objects.filter(
+        user=state['user']).values_list('author', flat=True)
+    return Recipe.objects.filter(
+        author__in=list(authors),
+        pk__in=Subquery(Recipe.objects.filter(
+            author=OuterRef('author')).values('pk')[:3]),
+    )
+
+
+# (название, queryset, таблицы, которые нельзя читать полным перебором,
+#  СУБД, для которых проверка имеет смысл)
+HOT_QUERIES = (
+    ('recipes-list', lambda state: recipes(state)[:6],
+     ('recipes_recipe', 'recipes_favorite', 'recipes_cart', 'users_follow'),
+     None),
+    ('recipes-list ?author',
+     lambda state: recipes(state, author=state['author'])[:6],
+     ('recipes_recipe',), None),
+    ('recipes-list ?tags',
+     lambda state: recipes(state, tags=['breakfast'])[:6],
+     ('recipes_recipe_tags',), None),
+    ('recipes-list ?is_favorited',
+     lambda state: recipes(state, is_favorited=1)[:6],
+     ('recipes_favorite',), None),
+    ('recipes-recommended',
+     lambda state: get_recommended(recipes(state), state['user'])[0][:6],
+     ('recipes_similarrecipe', 'recipes_favorite', 'recipes_cart'), None),
+    ('recipes-recommended popular',
+     lambda state: get_recommended(recipes(state), state['user'])[1][:6],
+     ('recipes_recipe',), None),
+    ('favorite lookup', lambda state: Favorite.objects.filter(
+        user=state['user'], recipe=state['recipe']),
+     ('recipes_favorite',), None),
+    ('users-subscriptions',
+     lambda state: Follow.objects.filter(user=state['user'])[:6],
+     ('users_follow',), None),
+    ('users-subscriptions recipes_limit', subscription_recipes,
+     ('recipes_recipe',), None),
+    ('shopping list', lambda state: get_shop_list(state['user']),
+     ('recipes_cartingredienttotal',), None),
+    # В SQLite LIKE не учитывает регистр и не использует обычный индекс.
+    ('ingredient prefix',
+     lambda state: Ingredient.objects.filter(name__startswith='мол'),
+     ('recipes_ingredient',), ('postgresql',)),
+    ('renditions pending', lambda state: Recipe.objects.exclude(
+        image='').exclude(renditions_source=F('image')).values('pk'),
+     ('recipes_recipe',), None),
+)
+
+
+def full_scans(plan, tables):
+    """Таблицы из tables, которые план читает полным перебором."""
+    if connection.vendor == 'postgresql':
+        pattern = r'Seq Scan on {}\b'
+    else:
+        pattern = r'\bSCAN (?:TABLE )?{}\b(?!.*\bINDEX\b)'
+    return [
+        table for table in tables
+        if re.search(pattern.format(table), plan)
+    ]
+
+
+def explain(queryset):
+    if connection.vendor != 'postgresql':
+        return queryset.explain()
+    # На небольшой тестовой базе перебор дешевле индекса, поэтому
+    # проверяется, что индекс может быть использован.
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет тестовую базу синтетическими данными и проверяет по '
+        'EXPLAIN, что горячие запросы API читают таблицы по индексам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=300)
+        parser.add_argument('--follows', type=int, default=10)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--cart', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--plans', action='store_true',
+                            help='Печатать планы всех запросов.')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(
+                f'СУБД {connection.vendor} не поддерживается')
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(IMAGE_PROCESSING_ASYNC=False):
+                state = seed(options)
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            failures = self.check_queries(state, options['plans'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        if failures:
+            raise CommandError(
+                'Запросы без индекса:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(
+            'Все горячие запросы используют индексы.'))
+
+    def check_queries(self, state, show_plans):
+        failures = []
+        for name, build, tables, vendors in HOT_QUERIES:
+            if vendors and connection.vendor not in vendors:
+                self.stdout.write(f'{name:<40}пропущен')
+                continue
+            plan = explain(build(state))
+            scans = full_scans(plan, tables)
+            self.stdout.write(
+                f'{name:<40}' + (self.style.ERROR(
+                    'перебор: ' + ', '.join(scans)) if scans else 'ok'))
+            if scans or show_plans:
+                self.stdout.write(plan + '\n')
+            if scans:
+                failures.append(f'{name}: {", ".join(scans)}')
+        return failures
@@ -0,0 +1,45 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.transfer import DEFAULT_BATCH_SIZE, export_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает рецепты с ингредиентами, тегами и путями к изображениям '
+        'в NDJSON: по одному рецепту в строке.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для выгрузки, по умолчанию stdout.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Сколько рецептов читать из базы за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        started = perf_counter()
+        lines = export_recipes(batch_size=options['batch_size'])
+        if options['output'] == '-':
+            total = self.write(lines, self.stdout)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                total = self.write(lines, file)
+        self.stderr.write(self.style.SUCCESS(
+            f' Выгружено рецептов: {total} '
+            f'({perf_counter() - started:.2f} с)'
+        ))
+
+    @staticmethod
+    def write(lines, file):
+        total = 0
+        for line in lines:
+            file.write(line)
+            total += 1
+        return total
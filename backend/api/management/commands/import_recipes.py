@@ -0,0 +1,68 @@
+import sys
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.transfer import DEFAULT_BATCH_SIZE, RecipeImporter, TransferError
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает рецепты из NDJSON, выгруженного export_recipes. '
+        'Рецепты всегда добавляются как новые. Пачки пишутся отдельными '
+        'транзакциями, поэтому при ошибке загруженные пачки остаются. '
+        'Файлы изображений не копируются, а копии изображений для '
+        'рецептов без них создаёт команда create_renditions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default='-',
+            help='Файл NDJSON, по умолчанию stdin.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Количество рецептов в одной транзакции.',
+        )
+        parser.add_argument(
+            '--default-author',
+            help='Email автора для рецептов, чей автор не найден.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        default_author = None
+        if options['default_author']:
+            default_author = User.objects.filter(
+                email=options['default_author']).first()
+            if default_author is None:
+                raise CommandError(
+                    f'Пользователь {options["default_author"]} не найден')
+
+        importer = RecipeImporter(default_author, options['batch_size'])
+        started = perf_counter()
+        try:
+            if options['path'] == '-':
+                importer.run(sys.stdin)
+            else:
+                with open(options['path'], encoding='utf-8') as file:
+                    importer.run(file)
+        except TransferError as error:
+            raise CommandError(
+                f'{error}. Загружено рецептов: {importer.recipes}')
+
+        elapsed = perf_counter() - started
+        rate = importer.recipes / elapsed if elapsed else importer.recipes
+        if importer.unknown_tags:
+            self.stdout.write(self.style.WARNING(
+                ' Пропущены неизвестные теги: '
+                + ', '.join(sorted(importer.unknown_tags))))
+        self.stdout.write(self.style.SUCCESS(
+            f' Загружено рецептов: {importer.recipes}, '
+            f'новых ингредиентов: {importer.created_ingredients} '
+            f'({elapsed:.2f} с, {rate:.0f} рецептов/с)'
+        ))
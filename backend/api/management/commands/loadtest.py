@@ -0,0 +1,118 @@
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median
+from threading import local
+from time import perf_counter
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.benchmarking import percentile
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=20',
+    '/api/tags/',
+    '/api/users/',
+)
+
+
+def db_sessions():
+    """Сколько соединений с текущей БД открыто с момента сброса статистики.
+
+    Счётчик есть только в PostgreSQL 14 и новее, иначе возвращает None.
+    """
+    if connection.vendor != 'postgresql' or connection.pg_version < 140000:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT sessions FROM pg_stat_database '
+            'WHERE datname = current_database()')
+        return cursor.fetchone()[0]
+
+
+class Client:
+    """HTTP-клиент с отдельным keep-alive соединением на поток."""
+
+    def __init__(self, url, token, timeout):
+        parts = urlsplit(url)
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https'
+            else http.client.HTTPConnection
+        )
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.headers = {'Authorization': f'Token {token}'} if token else {}
+        self.timeout = timeout
+        self.local = local()
+
+    def get(self, path):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = self.connection_class(
+                self.netloc, timeout=self.timeout)
+        started = perf_counter()
+        try:
+            conn.request('GET', quote(self.prefix + path, safe='/?&=%+,:'),
+                         headers=self.headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self.local.conn = None
+            return perf_counter() - started, None
+        return perf_counter() - started, response.status
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест запущенного сервера: задержка p50/p95/p99, '
+        'запросы в секунду и число новых соединений с PostgreSQL. '
+        'Для сравнения режимов запустите gunicorn с DB_CONN_MAX_AGE=0, '
+        'со значением по умолчанию и с DB_POOL=1.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000')
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Путь для запросов, можно указать несколько раз.')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--token', help='Токен для авторизации.')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError(
+                '--requests и --concurrency должны быть больше нуля')
+        paths = options['paths'] or DEFAULT_PATHS
+        client = Client(options['url'], options['token'], options['timeout'])
+        sessions_before = db_sessions()
+
+        started = perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = list(executor.map(client.get, (
+                paths[number % len(paths)]
+                for number in range(options['requests'])
+            )))
+        elapsed = perf_counter() - started
+
+        latencies = [duration * 1000 for duration, _ in results]
+        errors = sum(
+            1 for _, status in results if status is None or status >= 500)
+        self.stdout.write(
+            f' Запросов: {len(results)}, ошибок: {errors}, '
+            f'{len(results) / elapsed:.1f} запросов/с\n'
+            f' p50: {median(latencies):.2f} мс, '
+            f'p95: {percentile(latencies, 95):.2f} мс, '
+            f'p99: {percentile(latencies, 99):.2f} мс'
+        )
+        if sessions_before is not None:
+            opened = db_sessions() - sessions_before
+            self.stdout.write(
+                f' Новых соединений с БД: {opened} '
+                f'({opened / len(results):.2f} на запрос)')
+        if errors:
+            raise CommandError(f'Ошибочных ответов: {errors}')
@@ -0,0 +1,322 @@
+import multiprocessing
+import random
+from contextlib import contextmanager
+from io import BytesIO
+from itertools import accumulate
+from time import perf_counter
+
+import factory.random
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from PIL import Image
+
+from api.benchmarking import TAGS
+from api.search import update_search_index
+from recipes.factories import FAKE_IMAGE, RecipeFactory, TagFactory
+from recipes.models import (
+    Cart, Favorite, Ingredient, IngredientAmount, Recipe, Tag
+)
+from users.factories import PASSWORD, UserFactory
+from users.models import Follow
+
+INGREDIENTS_PER_RECIPE = (3, 12)
+# Сколько раз добирать выборку, если взвешенный выбор дал повторы.
+SAMPLE_ROUNDS = 10
+
+# Данные, общие для всех заданий: задаются в init_worker, а при
+# нескольких процессах передаются им один раз при запуске.
+_state = {}
+
+
+def zipf_weights(count, alpha):
+    """Накопленные веса закона Ципфа: k-й элемент в k^alpha раз реже."""
+    return list(accumulate(1 / rank ** alpha for rank in range(1, count + 1)))
+
+
+def pareto_count(rng, mean, alpha, limit):
+    """Случайное число с распределением Парето и средним около mean."""
+    if mean <= 0:
+        return 0
+    scale = mean * (alpha - 1) / alpha
+    return min(limit, int(scale * rng.paretovariate(alpha)))
+
+
+def sample_weighted(rng, population, cum_weights, count, exclude=None):
+    """До count разных элементов population с учётом весов."""
+    chosen = set()
+    for _ in range(SAMPLE_ROUNDS):
+        if len(chosen) >= count:
+            break
+        chosen.update(rng.choices(
+            population, cum_weights=cum_weights, k=count - len(chosen)))
+        chosen.discard(exclude)
+    return chosen
+
+
+def ranked(rng, ids, alpha):
+    """Перемешанные id и веса популярности для них."""
+    ids = list(ids)
+    rng.shuffle(ids)
+    return ids, zipf_weights(len(ids), alpha)
+
+
+@contextmanager
+def keep_pub_date():
+    """Не даёт bulk_create заменить pub_date текущим временем.
+
+    Команда работает в отдельном процессе, поэтому флаг auto_now_add
+    можно временно снять.
+    """
+    field = Recipe._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def insert(model, objects):
+    """bulk_create, возвращающий id новых записей."""
+    if connection.features.can_return_rows_from_bulk_insert:
+        model.objects.bulk_create(objects)
+        return [obj.pk for obj in objects]
+    # SQLite не возвращает id, но пишет только один процесс, и новые
+    # записи получают id больше всех существующих.
+    last_pk = model.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0
+    model.objects.bulk_create(objects)
+    return list(model.objects.filter(pk__gt=last_pk).order_by(
+        'pk').values_list('pk', flat=True))
+
+
+def init_worker(state):
+    _state.clear()
+    _state.update(state)
+
+
+def create_recipes(task):
+    """Рецепты одной пачки с ингредиентами и тегами."""
+    index, count = task
+    rng = random.Random(f'{_state["seed"]}-recipes-{index}')
+    factory.random.reseed_random(f'{_state["seed"]}-recipes-{index}')
+    authors = rng.choices(
+        _state['users'], cum_weights=_state['user_weights'], k=count)
+    recipes = RecipeFactory.build_batch(count, author=None)
+    for recipe, author_id in zip(recipes, authors):
+        recipe.author_id = author_id
+    with transaction.atomic(), keep_pub_date():
+        pks = insert(Recipe, recipes)
+        IngredientAmount.objects.bulk_create([
+            IngredientAmount(recipe_id=pk, ingredients_id=ingredient,
+                             amount=rng.randint(1, 500))
+            for pk in pks
+            for ingredient in sample_weighted(
+                rng, _state['ingredients'], _state['ingredient_weights'],
+                rng.randint(*INGREDIENTS_PER_RECIPE))
+        ])
+        tags = _state['tags']
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=pk, tag_id=tag)
+            for pk in pks
+            for tag in rng.sample(tags, rng.randint(1, min(3, len(tags))))
+        ])
+        update_search_index(pks)
+    return pks
+
+
+def create_relations(task):
+    """Избранное, корзины и подписки пользователей одной пачки."""
+    index, users = task
+    rng = random.Random(f'{_state["seed"]}-relations-{index}')
+    alpha, limit = _state['activity_alpha'], _state['max_per_user']
+    rows = {Favorite: [], Cart: [], Follow: []}
+    for user in users:
+        for model in (Favorite, Cart):
+            count = pareto_count(rng, _state[model], alpha, limit)
+            rows[model].extend(
+                model(user_id=user, recipe_id=recipe)
+                for recipe in sample_weighted(
+                    rng, _state['recipes'], _state['recipe_weights'], count)
+            )
+        count = pareto_count(rng, _state[Follow], alpha, limit)
+        rows[Follow].extend(
+            Follow(user_id=user, author_id=author)
+            for author in sample_weighted(
+                rng, _state['users'], _state['user_weights'], count,
+                exclude=user)
+        )
+    with transaction.atomic():
+        for model, objects in rows.items():
+            model.objects.bulk_create(objects, ignore_conflicts=True)
+    return sum(len(objects) for objects in rows.values())
+
+
+def chunks(items, size):
+    return [
+        (index, items[start:start + size])
+        for index, start in enumerate(range(0, len(items), size))
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными для нагрузочного '
+        'тестирования. Популярность авторов, рецептов и ингредиентов '
+        'подчиняется закону Ципфа, а число рецептов в избранном, корзине '
+        'и подписок у пользователя — распределению Парето, поэтому есть '
+        'популярные авторы, активные пользователи и большие корзины.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее число рецептов в избранном пользователя.')
+        parser.add_argument(
+            '--cart', type=float, default=5,
+            help='Среднее число рецептов в корзине пользователя.')
+        parser.add_argument(
+            '--follows', type=float, default=5,
+            help='Среднее число подписок пользователя.')
+        parser.add_argument(
+            '--max-per-user', type=int, default=1000,
+            help='Наибольшее число записей одного вида у пользователя.')
+        parser.add_argument(
+            '--popularity-alpha', type=float, default=1.0,
+            help='Показатель закона Ципфа для популярности.')
+        parser.add_argument(
+            '--activity-alpha', type=float, default=1.5,
+            help='Параметр распределения Парето для активности, больше 1.')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество записей в одной пачке.')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число процессов. В SQLite всегда один.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.check_options(options)
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                ' SQLite не поддерживает параллельную запись, '
+                'используется один процесс.'))
+            workers = 1
+
+        started = perf_counter()
+        rng = random.Random(options['seed'])
+        self.create_reference_data()
+        users, user_weights = ranked(
+            rng, self.create_users(options), options['popularity_alpha'])
+        ingredients, ingredient_weights = ranked(
+            rng, Ingredient.objects.values_list('pk', flat=True),
+            options['popularity_alpha'])
+        state = {
+            'seed': options['seed'],
+            'users': users,
+            'user_weights': user_weights,
+            'ingredients': ingredients,
+            'ingredient_weights': ingredient_weights,
+            'tags': list(Tag.objects.values_list('pk', flat=True)),
+        }
+        recipe_tasks = [
+            (index, min(options['batch_size'], options['recipes'] - start))
+            for index, start in enumerate(
+                range(0, options['recipes'], options['batch_size']))
+        ]
+        recipes = [
+            pk for pks in self.run_tasks(
+                'Рецепты', create_recipes, recipe_tasks, state, workers)
+            for pk in pks
+        ]
+
+        state['recipes'], state['recipe_weights'] = ranked(
+            rng, recipes, options['popularity_alpha'])
+        state.update({
+            Favorite: options['favorites'],
+            Cart: options['cart'],
+            Follow: options['follows'],
+            'activity_alpha': options['activity_alpha'],
+            'max_per_user': options['max_per_user'],
+        })
+        # На пользователя приходятся десятки связей, поэтому пачки меньше.
+        user_batch = max(1, options['batch_size'] // 50)
+        relations = sum(self.run_tasks(
+            'Связи', create_relations, chunks(users, user_batch),
+            state, workers))
+
+        call_command('recount', stdout=self.stdout)
+        call_command('rebuild_cart_totals', stdout=self.stdout)
+        self.save_image()
+        elapsed = perf_counter() - started
+        total = len(users) + len(recipes) + relations
+        self.stdout.write(self.style.SUCCESS(
+            f' Пользователей: {len(users)}, рецептов: {len(recipes)}, '
+            f'связей: {relations} ({elapsed:.2f} с, '
+            f'{total / elapsed:.0f} записей/с). '
+            f'Пароль пользователей: {PASSWORD}'
+        ))
+
+    @staticmethod
+    def check_options(options):
+        for option in ('users', 'recipes', 'batch_size', 'workers',
+                       'max_per_user'):
+            if options[option] < 1:
+                raise CommandError(
+                    f'--{option.replace("_", "-")} должен быть больше нуля')
+        if options['activity_alpha'] <= 1:
+            raise CommandError('--activity-alpha должен быть больше 1')
+
+    def create_reference_data(self):
+        if not Tag.objects.exists():
+            for name, color, slug in TAGS:
+                TagFactory(name=name, color=color, slug=slug)
+        if not Ingredient.objects.exists():
+            call_command('import_csv', stdout=self.stdout)
+
+    def create_users(self, options):
+        last_pk = UserFactory._meta.model.objects.order_by(
+            '-pk').values_list('pk', flat=True).first() or 0
+        # Имена продолжают нумерацию, чтобы не совпасть с прошлым запуском.
+        UserFactory.reset_sequence(last_pk + 1)
+        factory.random.reseed_random(f'{options["seed"]}-users')
+        users = []
+        for start in range(0, options['users'], options['batch_size']):
+            count = min(options['batch_size'], options['users'] - start)
+            users += insert(
+                UserFactory._meta.model, UserFactory.build_batch(count))
+        self.stdout.write(f' Пользователи: {len(users)}')
+        return users
+
+    def run_tasks(self, title, func, tasks, state, workers):
+        if workers == 1:
+            init_worker(state)
+            results = map(func, tasks)
+            return self.collect(title, results, len(tasks))
+        # Процессы наследуют состояние через fork, открытые соединения
+        # с БД им передавать нельзя.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(workers, init_worker, (state,)) as pool:
+            return self.collect(
+                title, pool.imap_unordered(func, tasks), len(tasks))
+
+    def collect(self, title, results, total):
+        collected = []
+        for number, result in enumerate(results, 1):
+            collected.append(result)
+            self.stdout.write(f' {title}: пачка {number} из {total}')
+        return collected
+
+    @staticmethod
+    def save_image():
+        if default_storage.exists(FAKE_IMAGE):
+            return
+        buffer = BytesIO()
+        Image.new('RGB', (600, 400), TAGS[0][1]).save(buffer, 'PNG')
+        default_storage.save(FAKE_IMAGE, ContentFile(buffer.getvalue()))
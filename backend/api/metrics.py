@@ -0,0 +1,207 @@
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+
+from django.db.backends.signals import connection_created
+from rest_framework import serializers
+
+# Границы корзин гистограммы длительности запросов, в секундах.
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = {
+    'foodgram_http_requests_total': (
+        'counter', 'Число HTTP-запросов.'),
+    'foodgram_http_request_duration_seconds': (
+        'histogram', 'Время обработки HTTP-запроса.'),
+    'foodgram_db_queries_total': (
+        'counter', 'Число SQL-запросов.'),
+    'foodgram_db_query_duration_seconds_total': (
+        'counter', 'Суммарное время SQL-запросов.'),
+    'foodgram_db_duplicate_queries_total': (
+        'counter', 'Повторы одного и того же SQL в рамках HTTP-запроса.'),
+    'foodgram_serializer_duration_seconds_total': (
+        'counter', 'Суммарное время сериализации ответов.'),
+    'foodgram_budget_exceeded_total': (
+        'counter', 'Превышения бюджета производительности.'),
+}
+
+current_stats = ContextVar('current_stats', default=None)
+
+
+class RequestStats:
+    """Замеры одного HTTP-запроса.
+
+    Текущий экземпляр хранится в contextvar, поэтому запросы к БД и
+    сериализация учитываются и в потоках, куда async-представления
+    передают синхронный код.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.serializer_time = 0
+        self.serializing = False
+        self.total_time = 0
+
+    @property
+    def sql_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self):
+        """{SQL: сколько раз выполнен} для запросов, выполненных повторно.
+
+        SQL сравнивается без параметров, поэтому одинаковые запросы для
+        разных объектов — признак N+1 — тоже считаются повторами.
+        """
+        counts = Counter(sql for sql, _ in self.queries)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.duplicates().values())
+
+    def server_timing(self):
+        return (
+            f'total;dur={self.total_time * 1000:.1f}, '
+            f'db;dur={self.sql_time * 1000:.1f};'
+            f'desc="{len(self.queries)} queries, '
+            f'{self.duplicate_count()} duplicates", '
+            f'serializer;dur={self.serializer_time * 1000:.1f}'
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries.append((sql, perf_counter() - started))
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _timed_data(prop):
+    def data(self):
+        stats = current_stats.get()
+        # Вложенные сериализаторы уже учтены во внешнем.
+        if stats is None or stats.serializing:
+            return prop.fget(self)
+        stats.serializing = True
+        started = perf_counter()
+        try:
+            return prop.fget(self)
+        finally:
+            stats.serializing = False
+            stats.serializer_time += perf_counter() - started
+
+    data.timed = True
+    return property(data)
+
+
+def instrument():
+    """Включает замеры SQL-запросов и сериализации.
+
+    Запись SQL подключается к каждому новому соединению с БД. В DRF нет
+    точки расширения для замера сериализации, поэтому свойство data
+    сериализаторов подменяется один раз при запуске приложения.
+    """
+    connection_created.connect(
+        install_query_recorder, dispatch_uid='api.metrics')
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(cls.data.fget, 'timed', False):
+            cls.data = _timed_data(cls.data)
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Registry:
+    """Метрики процесса в текстовом формате Prometheus.
+
+    Значения хранятся в памяти, поэтому у каждого рабочего процесса
+    gunicorn они свои: /metrics отдаёт метрики того процесса, который
+    обработал запрос.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._counters[name, tuple(sorted(labels.items()))] += value
+
+    def observe(self, name, labels, value):
+        key = name, tuple(sorted(labels.items()))
+        with self._lock:
+            buckets = self._histograms.setdefault(
+                key, [0] * (len(DURATION_BUCKETS) + 2))
+            buckets[bisect_left(DURATION_BUCKETS, value)] += 1
+            buckets[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def _samples(self):
+        samples = defaultdict(list)
+        for (name, labels), value in sorted(self._counters.items()):
+            samples[name].append(f'{name}{_format_labels(labels)} {value}')
+        for (name, labels), buckets in sorted(self._histograms.items()):
+            cumulative = 0
+            for bound, count in zip(
+                    DURATION_BUCKETS + ('+Inf',), buckets[:-1]):
+                cumulative += count
+                samples[name].append(
+                    f'{name}_bucket{_format_labels(labels, le=bound)} '
+                    f'{cumulative}')
+            samples[name].append(
+                f'{name}_sum{_format_labels(labels)} {buckets[-1]}')
+            samples[name].append(
+                f'{name}_count{_format_labels(labels)} {cumulative}')
+        return samples
+
+    def render(self):
+        with self._lock:
+            samples = self._samples()
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples.get(name, ()))
+        return '\n'.join(lines) + '\n'
+
+    def record(self, method, route, status, stats):
+        labels = {'method': method, 'route': route}
+        self.inc('foodgram_http_requests_total',
+                 dict(labels, status=status))
+        self.observe('foodgram_http_request_duration_seconds',
+                     labels, stats.total_time)
+        self.inc('foodgram_db_queries_total', labels, len(stats.queries))
+        self.inc('foodgram_db_query_duration_seconds_total',
+                 labels, stats.sql_time)
+        self.inc('foodgram_db_duplicate_queries_total',
+                 labels, stats.duplicate_count())
+        self.inc('foodgram_serializer_duration_seconds_total',
+                 labels, stats.serializer_time)
+
+
+registry = Registry()
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import RequestStats, current_stats, registry
+
+logger = logging.getLogger(__name__)
+
+# Сколько самых долгих запросов выводить в предупреждении.
+SLOW_QUERIES_IN_LOG = 3
+
+
+def get_budget(route):
+    budgets = settings.PERFORMANCE_BUDGETS
+    return {**budgets['default'], **budgets.get(route, {})}
+
+
+def exceeded_budgets(route, stats):
+    budget = get_budget(route)
+    values = {
+        'time': stats.total_time,
+        'queries': len(stats.queries),
+        'duplicates': stats.duplicate_count(),
+    }
+    return {
+        name: (value, budget[name]) for name, value in values.items()
+        if budget.get(name) is not None and value > budget[name]
+    }
+
+
+def offending_sql(stats, exceeded):
+    """Самый частый повторяющийся SQL или самые долгие запросы."""
+    if 'duplicates' in exceeded:
+        sql, count = max(stats.duplicates().items(), key=lambda item: item[1])
+        return [f'{count} раз: {sql}']
+    slowest = sorted(stats.queries, key=lambda query: query[1], reverse=True)
+    return [
+        f'{duration * 1000:.1f} мс: {sql}'
+        for sql, duration in slowest[:SLOW_QUERIES_IN_LOG]
+    ]
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unmatched'
+
+
+class PerformanceMiddleware:
+    """Замеряет время, SQL-запросы и сериализацию каждого запроса.
+
+    Результаты попадают в метрики для /metrics и заголовок
+    Server-Timing, а при превышении PERFORMANCE_BUDGETS маршрута в лог
+    пишется предупреждение с проблемными запросами. Работает и в WSGI,
+    и в ASGI без перевода цепочки middleware в синхронный режим.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PERFORMANCE_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django распознаёт асинхронный middleware.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish(request, response, stats, started)
+
+    def finish(self, request, response, stats, started):
+        stats.total_time = perf_counter() - started
+        route = route_name(request)
+        registry.record(request.method, route, response.status_code, stats)
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response['Server-Timing'] = stats.server_timing()
+        self.check_budgets(request, route, stats)
+        return response
+
+    def check_budgets(self, request, route, stats):
+        exceeded = exceeded_budgets(route, stats)
+        if not exceeded:
+            return
+        for name in exceeded:
+            registry.inc('foodgram_budget_exceeded_total',
+                         {'route': route, 'budget': name})
+        logger.warning(
+            '%s %s (%s) превысил бюджет: %s\n%s',
+            request.method, request.path, route,
+            ', '.join(f'{name} {value:g} > {limit:g}'
+                      for name, (value, limit) in exceeded.items()),
+            '\n'.join(offending_sql(stats, exceeded)),
+        )
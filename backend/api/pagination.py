@@ -1,6 +1,60 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class LimitCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
+
+
+class RecipeCursorPagination(LimitCursorPagination):
+    ordering = ('-pub_date', '-id')
 
 
 class LimitPageNumberPagination(PageNumberPagination):
+    """Постраничная пагинация с переходом на курсорную.
+
+    Если в запросе передан параметр cursor (в том числе пустой), страницы
+    выбираются по ключу сортировки, а не через OFFSET и COUNT(*).
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    cursor_pagination_class = LimitCursorPagination
+    cursor_paginator = None
+
+    def get_cursor_pagination_class(self, request):
+        return self.cursor_pagination_class
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_class = self.get_cursor_pagination_class(request)
+        if (cursor_class is not None
+                and cursor_class.cursor_query_param in request.query_params):
+            self.cursor_paginator = cursor_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(LimitPageNumberPagination):
+    """Курсор сортирует по дате, поэтому при поиске он не используется:
+    выдача остаётся упорядоченной по релевантности и делится на страницы
+    по номерам.
+    """
+    cursor_pagination_class = RecipeCursorPagination
+    search_query_param = 'search'
+
+    def get_cursor_pagination_class(self, request):
+        if request.query_params.get(self.search_query_param):
+            return None
+        return super().get_cursor_pagination_class(request)
+
+
+class RankedPagination(LimitPageNumberPagination):
+    """Для выдачи, упорядоченной по релевантности, без курсора."""
+    cursor_pagination_class = None
@@ -0,0 +1,15 @@
+from rest_framework.parsers import BaseParser
+
+from .transfer import NDJSON_CONTENT_TYPE
+
+
+class NDJSONParser(BaseParser):
+    """Отдаёт тело запроса как поток строк без разбора.
+
+    Строки читаются по мере обработки, поэтому большой файл не
+    загружается в память целиком.
+    """
+    media_type = NDJSON_CONTENT_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream or ()
@@ -0,0 +1,54 @@
+import csv
+
+from rest_framework.renderers import BaseRenderer
+
+
+class EchoBuffer:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class ShopListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Список отдаётся потоково через stream(), render() используется
+    только для ответов с ошибками.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = '\n'.join(str(value) for value in data.values())
+        return str(data or '').encode(self.charset)
+
+    def stream(self, rows):
+        raise NotImplementedError('Метод stream() должен быть определён')
+
+
+class ShopListTextRenderer(ShopListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield 'Список покупок: \n'
+        for row in rows:
+            yield (
+                f"{row['name']} - "
+                f"{row['amount']} "
+                f"{row['measurement_unit']} \n"
+            )
+
+
+class ShopListCSVRenderer(ShopListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(('Ингредиент', 'Количество', 'Единицы'))
+        for row in rows:
+            yield writer.writerow(
+                (row['name'], row['amount'], row['measurement_unit'])
+            )
@@ -0,0 +1,394 @@
+import logging
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from threading import Lock
+from time import monotonic
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector
+)
+from django.db import connections
+from django.db.models import (
+    Case, F, FloatField, OuterRef, Subquery, Value, When
+)
+
+from recipes.models import Ingredient, IngredientAmount, Recipe
+from recipes.transactions import CommitBatch
+from .cache import bump_version, get_version, ingredients_cache
+
+logger = logging.getLogger(__name__)
+
+SEARCH_LIMIT = 20
+INDEX_TTL = 300
+SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_LIMIT = 500
+# Веса полей совпадают с весами A, B и C в ts_rank PostgreSQL.
+FIELD_WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pantry')
+
+
+class IngredientIndex:
+    """Кэш ингредиентов в памяти процесса для автодополнения.
+
+    Ингредиенты хранятся отсортированными по названию в нижнем регистре,
+    поэтому совпадения по началу названия находятся бинарным поиском.
+    Кэш сбрасывается сигналами при записи ингредиентов, а другие
+    процессы перестраивают его, когда меняется номер версии справочника
+    ингредиентов в общем кэше.
+    """
+
+    def __init__(self, version_key):
+        self.version_key = version_key
+        self._lock = Lock()
+        self._keys = None
+        self._items = None
+        self._version = None
+
+    def invalidate(self):
+        with self._lock:
+            self._keys = None
+            self._items = None
+
+    def _build(self, version):
+        ingredients = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda item: (item['name'].casefold(), item['id'])
+        )
+        keys = [item['name'].casefold() for item in ingredients]
+        with self._lock:
+            self._keys, self._items = keys, ingredients
+            self._version = version
+        return keys, ingredients
+
+    def _get(self):
+        version = get_version(self.version_key)
+        with self._lock:
+            keys, items = self._keys, self._items
+            current = self._version == version
+        if keys is None or not current:
+            return self._build(version)
+        return keys, items
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        query = query.strip().casefold()
+        keys, items = self._get()
+        start = bisect_left(keys, query)
+        end = start
+        stop = min(len(keys), start + limit)
+        while end < stop and keys[end].startswith(query):
+            end += 1
+        result = items[start:end]
+        if len(result) < limit:
+            substring_matches = (
+                item for key, item in zip(keys, items)
+                if query in key and not key.startswith(query)
+            )
+            result += islice(substring_matches, limit - len(result))
+        return result
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text.casefold().replace('ё', 'е'))
+
+
+class RecipeIndex:
+    """Инвертированный индекс рецептов в памяти процесса.
+
+    Заменяет полнотекстовый поиск PostgreSQL на других СУБД (SQLite при
+    локальной разработке). Слова запроса ищутся как префиксы слов из
+    названия, ингредиентов и описания рецепта, все слова обязательны.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._postings = None
+        self._documents = {}
+        self._tokens = []
+        self._built_at = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+            self._documents = {}
+            self._tokens = []
+
+    @staticmethod
+    def _read(recipes):
+        documents = defaultdict(lambda: defaultdict(float))
+
+        def add(recipe_id, text, field):
+            for token in tokenize(text):
+                documents[recipe_id][token] += FIELD_WEIGHTS[field]
+
+        for pk, name, text in recipes.values_list('pk', 'name', 'text'):
+            add(pk, name, 'name')
+            add(pk, text, 'text')
+        amounts = IngredientAmount.objects.filter(recipe__in=recipes)
+        for recipe_id, name in amounts.values_list(
+                'recipe_id', 'ingredients__name'):
+            add(recipe_id, name, 'ingredients')
+        return documents
+
+    def _add(self, documents):
+        for recipe_id, tokens in documents.items():
+            self._documents[recipe_id] = set(tokens)
+            for token, weight in tokens.items():
+                self._postings.setdefault(token, {})[recipe_id] = weight
+        self._tokens = None
+
+    def _remove(self, recipe_ids):
+        for recipe_id in recipe_ids:
+            for token in self._documents.pop(recipe_id, ()):
+                self._postings[token].pop(recipe_id, None)
+                if not self._postings[token]:
+                    del self._postings[token]
+        self._tokens = None
+
+    def update(self, recipe_ids):
+        """Переиндексирует рецепты, удалённые рецепты убирает."""
+        with self._lock:
+            if self._postings is None:
+                return
+            self._remove(recipe_ids)
+            self._add(self._read(Recipe.objects.filter(pk__in=recipe_ids)))
+
+    def _get(self):
+        if (self._postings is None
+                or monotonic() - self._built_at > INDEX_TTL):
+            self._postings = {}
+            self._documents = {}
+            self._add(self._read(Recipe.objects.all()))
+            self._built_at = monotonic()
+        if self._tokens is None:
+            self._tokens = sorted(self._postings)
+        return self._postings, self._tokens
+
+    def _match(self, term):
+        postings, tokens = self._get()
+        scores = defaultdict(float)
+        position = bisect_left(tokens, term)
+        while position < len(tokens) and tokens[position].startswith(term):
+            for recipe_id, weight in postings[tokens[position]].items():
+                scores[recipe_id] = max(scores[recipe_id], weight)
+            position += 1
+        return scores
+
+    def search(self, query, limit=RECIPE_SEARCH_LIMIT):
+        """Список (id рецепта, вес) по убыванию веса."""
+        scores = None
+        with self._lock:
+            for term in tokenize(query):
+                matches = self._match(term)
+                if scores is not None:
+                    matches = {
+                        recipe_id: scores[recipe_id] + weight
+                        for recipe_id, weight in matches.items()
+                        if recipe_id in scores
+                    }
+                scores = matches
+                if not scores:
+                    break
+        return sorted(
+            (scores or {}).items(), key=lambda item: item[1], reverse=True
+        )[:limit]
+
+
+class PantryIndex:
+    """Разреженная матрица «рецепт → ингредиенты» в памяти процесса.
+
+    Для каждого ингредиента хранится множество рецептов, в которые он
+    входит, поэтому при подборе рецептов по продуктам просматриваются
+    только рецепты, где есть хотя бы один продукт из списка.
+
+    Номер версии состава рецептов хранится в общем кэше и меняется после
+    записи. Процесс, заметивший новую версию, перестраивает матрицу в
+    фоновом потоке и до конца перестройки отвечает по прежней.
+    """
+
+    version_key = 'index_version:pantry'
+
+    def __init__(self):
+        self._lock = Lock()
+        self._recipes = None
+        self._postings = {}
+        self._version = None
+        self._rebuilding = False
+
+    def invalidate(self):
+        with self._lock:
+            self._recipes = None
+            self._postings = {}
+
+    @staticmethod
+    def _add(recipes, postings, pairs):
+        added = defaultdict(set)
+        for recipe_id, ingredient_id in pairs:
+            added[recipe_id].add(ingredient_id)
+            postings.setdefault(ingredient_id, set()).add(recipe_id)
+        for recipe_id, ingredients in added.items():
+            recipes[recipe_id] = frozenset(ingredients)
+
+    def _remove(self, recipe_ids):
+        for recipe_id in recipe_ids:
+            for ingredient_id in self._recipes.pop(recipe_id, ()):
+                self._postings[ingredient_id].discard(recipe_id)
+                if not self._postings[ingredient_id]:
+                    del self._postings[ingredient_id]
+
+    @staticmethod
+    def _read(**lookup):
+        return IngredientAmount.objects.filter(**lookup).values_list(
+            'recipe_id', 'ingredients_id').iterator()
+
+    def update(self, recipe_ids):
+        """Перечитывает состав рецептов, удалённые рецепты убирает.
+
+        Новая версия заставит перестроить матрицу другие процессы.
+        Этот процесс принимает её без перестройки, если до изменения
+        его матрица была актуальной.
+        """
+        previous = get_version(self.version_key)
+        version = bump_version(self.version_key)
+        with self._lock:
+            if self._recipes is None:
+                return
+            self._remove(recipe_ids)
+            self._add(self._recipes, self._postings,
+                      self._read(recipe__in=recipe_ids))
+            if self._version == previous and not self._rebuilding:
+                self._version = version
+
+    def _build(self):
+        recipes, postings = {}, {}
+        self._add(recipes, postings, self._read())
+        return recipes, postings
+
+    def _rebuild_in_worker(self, version):
+        try:
+            recipes, postings = self._build()
+            with self._lock:
+                self._recipes, self._postings = recipes, postings
+                self._version = version
+        except Exception:
+            logger.exception('Ошибка перестройки индекса состава рецептов')
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            connections.close_all()
+
+    def _get(self):
+        version = get_version(self.version_key)
+        with self._lock:
+            if self._recipes is None:
+                # Первая сборка выполняется в запросе: отвечать пока не
+                # по чему.
+                self._recipes, self._postings = self._build()
+                self._version = version
+            elif version != self._version and not self._rebuilding:
+                self._rebuilding = True
+                executor.submit(self._rebuild_in_worker, version)
+            return self._recipes, self._postings
+
+    def match(self, pantry, min_coverage=0):
+        """Рецепты, которые можно приготовить из продуктов pantry.
+
+        Возвращает список (id рецепта, доля имеющихся ингредиентов,
+        id недостающих ингредиентов): сначала рецепты с наибольшей
+        долей, при равенстве — с меньшим числом недостающих.
+        """
+        pantry = frozenset(pantry)
+        recipes, postings = self._get()
+        with self._lock:
+            hits = defaultdict(int)
+            for ingredient_id in pantry:
+                for recipe_id in postings.get(ingredient_id, ()):
+                    hits[recipe_id] += 1
+            result = []
+            for recipe_id, count in hits.items():
+                ingredients = recipes[recipe_id]
+                coverage = count / len(ingredients)
+                if coverage >= min_coverage:
+                    result.append((
+                        recipe_id, coverage, sorted(ingredients - pantry)
+                    ))
+        result.sort(key=lambda item: (-item[1], len(item[2]), -item[0]))
+        return result
+
+
+def is_postgresql(queryset=None):
+    db = Recipe.objects.db if queryset is None else queryset.db
+    return connections[db].vendor == 'postgresql'
+
+
+def search_vector():
+    ingredient_names = Subquery(
+        IngredientAmount.objects.filter(recipe=OuterRef('pk')).order_by()
+        .values('recipe')
+        .annotate(names=StringAgg('ingredients__name', ' '))
+        .values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(ingredient_names, weight='B', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_index(recipe_ids):
+    """Обновляет поисковый индекс для рецептов с указанными id."""
+    if is_postgresql():
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            search_vector=search_vector())
+    else:
+        recipe_index.update(recipe_ids)
+
+
+def _reindex(recipe_ids):
+    update_search_index(recipe_ids)
+    pantry_index.update(recipe_ids)
+
+
+reindex = CommitBatch(_reindex, 'recipe_ids')
+
+
+def schedule_reindex(recipe_ids):
+    """Копит id рецептов и переиндексирует их после commit.
+
+    Обновляются поисковый индекс и индекс состава рецептов.
+    """
+    reindex.add(recipe_ids=recipe_ids)
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, по убыванию релевантности.
+
+    На любой СУБД выдача ограничена RECIPE_SEARCH_LIMIT самыми
+    релевантными рецептами.
+    """
+    if is_postgresql(queryset):
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch')
+        found = queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-pub_date', '-id')
+        return found.filter(
+            pk__in=found.values('pk')[:RECIPE_SEARCH_LIMIT])
+    ranked = recipe_index.search(query)
+    return queryset.filter(pk__in=[pk for pk, _ in ranked]).annotate(
+        rank=Case(
+            *[When(pk=pk, then=Value(score)) for pk, score in ranked],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    ).order_by('-rank', '-pub_date', '-id')
+
+
+ingredient_index = IngredientIndex(ingredients_cache.version_key)
+recipe_index = RecipeIndex()
+pantry_index = PantryIndex()
@@ -1,19 +1,68 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.db.models import F
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 from rest_framework.response import Response
 
-from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from recipes.images import content_hash
+from recipes.models import (
+    CartIngredientTotal, Ingredient, IngredientAmount, Recipe, Tag
+)
+from recipes.signals import schedule_cart_refresh
 from users.models import Follow
 
 User = get_user_model()
 
 
+def get_recipes_limit(request):
+    limit = request.query_params.get('recipes_limit', '')
+    return int(limit) if limit.isdigit() else None
+
+
+class RecipeImageField(Base64ImageField):
+    """Изображение в base64, сохраняемое под именем хеша содержимого.
+
+    Если такое изображение уже загружалось, используется существующий
+    файл без повторной записи.
+    """
+
+    def get_file_name(self, decoded_file):
+        return content_hash(decoded_file)
+
+    def to_internal_value(self, base64_data):
+        image = super().to_internal_value(base64_data)
+        if image is None:
+            return image
+        path = Recipe.image.field.generate_filename(None, image.name)
+        if default_storage.exists(path):
+            return path
+        return image
+
+
+class RenditionField(serializers.ImageField):
+    """URL уменьшенной копии изображения рецепта.
+
+    Пока копия не готова, отдаётся URL оригинала.
+    """
+
+    def __init__(self, rendition, **kwargs):
+        self.rendition = rendition
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        image = getattr(recipe, self.rendition)
+        if not image or recipe.renditions_source != recipe.image.name:
+            image = recipe.image
+        return super().to_representation(image)
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -26,6 +75,28 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class IngredientAmountSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredients.id')
+    name = serializers.ReadOnlyField(source='ingredients.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredients.measurement_unit')
+
+    class Meta:
+        model = IngredientAmount
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
+class CartIngredientTotalSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
+
+    class Meta:
+        model = CartIngredientTotal
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
 class AddIngredientToRecipeSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField()
     ingredient = serializers.ReadOnlyField(source='ingredient.name')
@@ -59,6 +130,8 @@ class CustomUserSerializer(UserSerializer):
         read_only_fields = 'is_subscribed',
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -68,26 +141,23 @@ class CustomUserSerializer(UserSerializer):
 class RecipeReadSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     author = CustomUserSerializer()
-    ingredients = serializers.SerializerMethodField()
+    ingredients = IngredientAmountSerializer(source='ingredient', many=True)
     is_favorited = serializers.BooleanField(default=False)
     is_in_shopping_cart = serializers.BooleanField(default=False)
+    thumbnail = RenditionField('thumbnail')
+    medium = RenditionField('medium')
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart', 'name', 'image',
-                  'text', 'cooking_time',)
-
-    def get_ingredients(self, obj):
-        return obj.ingredients.values(
-            'id', 'name', 'measurement_unit', amount=F('recipe__amount')
-        )
+                  'thumbnail', 'medium', 'text', 'cooking_time',)
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     ingredients = AddIngredientToRecipeSerializer(many=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
 
     class Meta:
         model = Recipe
@@ -126,61 +196,123 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return data
 
     @staticmethod
-    def __add_tags_ingredients(instance, **validated_data):
-        ingredients = validated_data['ingredients']
-        tags = validated_data['tags']
-        for tag in tags:
-            instance.tags.add(tag)
-
-        ingredients_list = [
-            IngredientAmount(
-                recipe=instance,
-                ingredients_id=ingredient.get('id'),
-                amount=ingredient.get('amount')
-            )
-            for ingredient in ingredients
-        ]
-        IngredientAmount.objects.bulk_create(ingredients_list)
-        return instance
-
+    def __update_ingredients(instance, ingredients):
+        """Приводит ингредиенты рецепта к переданным минимумом запросов."""
+        current = {
+            amount.ingredients_id: amount
+            for amount in instance.ingredient.all()
+        }
+        to_create = []
+        to_update = []
+        for ingredient in ingredients:
+            amount = current.pop(ingredient.get('id'), None)
+            if amount is None:
+                to_create.append(IngredientAmount(
+                    recipe=instance,
+                    ingredients_id=ingredient.get('id'),
+                    amount=ingredient.get('amount')
+                ))
+            elif amount.amount != ingredient.get('amount'):
+                amount.amount = ingredient.get('amount')
+                to_update.append(amount)
+        if current:
+            IngredientAmount.objects.filter(
+                pk__in=[amount.pk for amount in current.values()]
+            ).delete()
+        if to_create:
+            IngredientAmount.objects.bulk_create(to_create)
+        if to_update:
+            IngredientAmount.objects.bulk_update(to_update, ['amount'])
+        if to_create or to_update:
+            # bulk-операции не отправляют сигналы, в отличие от delete().
+            schedule_cart_refresh([instance.pk])
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
-        tags = self.initial_data.get('tags')
         recipe = Recipe.objects.create(
             **validated_data,
             author=self.context.get('request').user
         )
-        return self.__add_tags_ingredients(
-            recipe, ingredients=ingredients, tags=tags)
+        recipe.tags.set(self.initial_data.get('tags'))
+        IngredientAmount.objects.bulk_create([
+            IngredientAmount(
+                recipe=recipe,
+                ingredients_id=ingredient.get('id'),
+                amount=ingredient.get('amount')
+            )
+            for ingredient in ingredients
+        ])
+        return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time
-        )
-        instance.ingredients.clear()
-        instance.tags.clear()
-        ingredients = validated_data.pop('ingredients')
+        ingredients = validated_data.pop('ingredients', None)
         tags = self.initial_data.get('tags')
-        instance = self.__add_tags_ingredients(
-            instance, ingredients=ingredients, tags=tags)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self.__update_ingredients(instance, ingredients)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'ingredient',
+                queryset=IngredientAmount.objects.select_related(
+                    'ingredients').order_by('ingredients__name')
+            ),
+        )
         return RecipeReadSerializer(instance,
                                     context=context).data
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    thumbnail = RenditionField('thumbnail')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnail', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=100,
+    )
+
+    def validate_recipes(self, value):
+        recipes = Recipe.objects.in_bulk(value)
+        missing = sorted(set(value) - set(recipes))
+        if missing:
+            raise serializers.ValidationError(
+                f'Рецепты не найдены: {", ".join(map(str, missing))}')
+        return list(recipes.values())
+
+
+class PantrySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False
+    )
+    min_coverage = serializers.FloatField(
+        min_value=0, max_value=1, default=0
+    )
+
+
+class PantryRecipeSerializer(ShortRecipeSerializer):
+    coverage = serializers.FloatField(read_only=True)
+    missing = IngredientSerializer(many=True, read_only=True)
+
+    class Meta(ShortRecipeSerializer.Meta):
+        fields = ShortRecipeSerializer.Meta.fields + ('coverage', 'missing')
+
+
 class FollowSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='author.id')
     email = serializers.ReadOnlyField(source='author.email')
@@ -210,20 +342,16 @@ class FollowSerializer(serializers.ModelSerializer):
         return data
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(
-            user=obj.user, author=obj.author
-        ).exists()
+        return True
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj.author)
-        if limit:
-            queryset = queryset[:int(limit)]
-        return ShortRecipeSerializer(queryset, many=True).data
+        recipes = getattr(obj.author, 'limited_recipes', None)
+        if recipes is None:
+            recipes = Recipe.objects.filter(author=obj.author)
+            limit = get_recipes_limit(self.context.get('request'))
+            if limit:
+                recipes = recipes[:limit]
+        return ShortRecipeSerializer(recipes, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.author.stats.recipes_count
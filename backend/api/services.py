@@ -1,36 +1,156 @@
-from http import HTTPStatus
-
-from django.db.models import Sum
-from rest_framework.response import Response
-
-from recipes.models import IngredientAmount
-
-
-def generate_shop_list(user):
-    ingredients = IngredientAmount.objects.filter(
-        recipe__cart__user=user).values(
-            'ingredients__name',
-            'ingredients__measurement_unit',
-    ).annotate(Sum('amount'))
-    if not ingredients:
-        return Response({'error': 'Ваша корзина пуста'},
-                        status=HTTPStatus.BAD_REQUEST)
-    shop_list = {}
-    for item in ingredients:
-        name = item['ingredients__name']
-        if name not in shop_list:
-            shop_list[name] = {
-                'name': item['ingredients__name'],
-                'unit': item['ingredients__measurement_unit'],
-                'amount': item['amount__sum']
-            }
-        else:
-            shop_list[name]['amount'] += item['amount__sum']
-    final_list = 'Список покупок: \n'
-    for ingredient in shop_list:
-        final_list += (
-            f"{shop_list[ingredient]['name']} - "
-            f"{shop_list[ingredient]['amount']} "
-            f"{shop_list[ingredient]['unit']} \n"
-        )
-    return final_list
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Case, Count, F, FloatField, Max, OuterRef, Q, Subquery, Sum, When
+)
+from django.db.models.functions import Coalesce
+
+from recipes.models import Cart, CartIngredientTotal, Favorite, SimilarRecipe
+from users.models import Follow
+from recipes.signals import recipe_ingredients, recount, refresh_cart_totals
+
+# Крупные единицы для вывода больших количеств: 1500 г -> 1.5 кг.
+LARGER_UNITS = {
+    'г': ('кг', 1000),
+    'мл': ('л', 1000),
+}
+
+# Вес рецепта автора, на которого подписан пользователь, в рекомендациях.
+FOLLOW_WEIGHT = 0.5
+
+
+def get_shop_list(user):
+    """Ингредиенты из корзины пользователя одним сгруппированным запросом.
+
+    Суммы по ингредиентам берутся из CartIngredientTotal. Строки с
+    одинаковым названием и переводимыми друг в друга единицами
+    складываются в базовой единице по множителю из MeasurementUnit.
+    Для групп из одной исходной единицы сохраняется сумма в ней.
+    """
+    return CartIngredientTotal.objects.filter(user=user).values(
+        name=F('ingredient__name'),
+        measurement_unit=Coalesce(
+            'ingredient__unit__base_unit', 'ingredient__measurement_unit'),
+    ).annotate(
+        # До аннотации amount: после неё 'amount' означает уже её.
+        source_amount=Sum('amount'),
+        source_units=Count('ingredient__measurement_unit', distinct=True),
+        source_unit=Max('ingredient__measurement_unit'),
+        amount=Sum(F('amount') * Coalesce(
+            'ingredient__unit__factor', 1, output_field=FloatField())),
+    ).order_by('name', 'measurement_unit')
+
+
+def format_amount(value):
+    """Количество без лишних нулей: 1.5, 200, 0.33."""
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+def humanize_row(row):
+    """Строка списка покупок в удобных для чтения единицах."""
+    if row['source_units'] == 1:
+        amount, unit = row['source_amount'], row['source_unit']
+    else:
+        amount, unit = row['amount'], row['measurement_unit']
+    if unit in LARGER_UNITS:
+        larger, factor = LARGER_UNITS[unit]
+        if amount >= factor:
+            amount, unit = amount / factor, larger
+    return {
+        'name': row['name'],
+        'amount': format_amount(amount),
+        'measurement_unit': unit,
+    }
+
+
+def generate_shop_list(user, renderer):
+    """Потоково формирует список покупок в формате рендерера."""
+    return renderer.stream(
+        humanize_row(row) for row in get_shop_list(user).iterator())
+
+
+def insert_new(objects):
+    """Вставляет записи, которых ещё нет, и возвращает вставленные.
+
+    Обычно хватает одной вставки. Если часть записей успел добавить
+    параллельный запрос, записи вставляются по одной, и в результат
+    попадают только добавленные этим вызовом.
+    """
+    try:
+        with transaction.atomic():
+            return type(objects[0]).objects.bulk_create(objects)
+    except IntegrityError:
+        pass
+    inserted = []
+    for obj in objects:
+        try:
+            with transaction.atomic():
+                obj.save(force_insert=True)
+        except IntegrityError:
+            continue
+        inserted.append(obj)
+    return inserted
+
+
+def add_recipes(model, user, recipes):
+    """Добавляет рецепты в избранное или корзину одной вставкой.
+
+    Возвращает рецепты, которых у пользователя ещё не было.
+    """
+    with transaction.atomic():
+        existing = set(model.objects.filter(
+            user=user, recipe__in=recipes
+        ).values_list('recipe_id', flat=True))
+        new = [
+            model(user=user, recipe=recipe)
+            for recipe in recipes if recipe.pk not in existing
+        ]
+        added = [obj.recipe for obj in insert_new(new)] if new else []
+        if added:
+            recount(model, [recipe.pk for recipe in added])
+            if model is Cart:
+                refresh_cart_totals([user.pk], recipe_ingredients(added))
+    return added
+
+
+def remove_recipes(model, user, recipes):
+    """Удаляет рецепты из избранного или корзины одним DELETE.
+
+    QuerySet.delete() при наличии сигналов выбирает и удаляет записи по
+    одной, поэтому удаление идёт без сигналов, а счётчики и суммы
+    корзины пересчитываются здесь же. Возвращает число удалённых записей.
+    """
+    queryset = model.objects.filter(user=user, recipe__in=recipes)
+    with transaction.atomic():
+        deleted = queryset._raw_delete(queryset.db)
+        if deleted:
+            recount(model, [recipe.pk for recipe in recipes])
+            if model is Cart:
+                refresh_cart_totals([user.pk], recipe_ingredients(recipes))
+    return deleted
+
+
+def get_recommended(queryset, user):
+    """Рекомендации и запасная выдача популярных рецептов.
+
+    queryset должен быть аннотирован полем is_subscribed. Рецепты
+    самого пользователя, его избранное и корзина исключаются.
+    """
+    favorites = Favorite.objects.filter(user=user).values('recipe')
+    cart = Cart.objects.filter(user=user).values('recipe')
+    similar = SimilarRecipe.objects.filter(
+        Q(recipe__in=favorites) | Q(recipe__in=cart)
+    )
+    score = similar.filter(similar=OuterRef('pk')).order_by().values(
+        'similar').annotate(total=Sum('score')).values('total')
+    queryset = queryset.exclude(
+        Q(pk__in=favorites) | Q(pk__in=cart) | Q(author=user))
+    recommended = queryset.filter(
+        Q(pk__in=similar.values('similar'))
+        | Q(author__in=Follow.objects.filter(user=user).values('author'))
+    ).annotate(score=(
+        Coalesce(Subquery(score), 0, output_field=FloatField())
+        + Case(When(is_subscribed=True, then=FOLLOW_WEIGHT),
+               default=0, output_field=FloatField())
+    )).order_by('-score', '-pub_date', '-id')
+    popular = queryset.order_by('-favorites_count', '-pub_date', '-id')
+    return recommended, popular
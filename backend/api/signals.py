@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from .cache import ingredients_cache, invalidate_tag_ids, tags_cache
+from .search import ingredient_index, schedule_reindex
+
+User = get_user_model()
+
+
+def touch_recipes(**lookup):
+    """Меняет версию рецептов, чтобы их данные в кэше устарели."""
+    Recipe.objects.filter(**lookup).update(updated=timezone.now())
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+    transaction.on_commit(ingredients_cache.bump)
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_ingredient_recipes(instance, created, **kwargs):
+    if not created:
+        touch_recipes(ingredients=instance)
+        schedule_reindex(Recipe.objects.filter(
+            ingredients=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+def touch_amount_recipe(instance, **kwargs):
+    touch_recipes(pk=instance.recipe_id)
+    schedule_reindex([instance.recipe_id])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def reindex_recipe(instance, **kwargs):
+    schedule_reindex([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_tag_recipes(instance, **kwargs):
+    touch_recipes(tags=instance)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(**kwargs):
+    invalidate_tag_ids()
+    transaction.on_commit(tags_cache.bump)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_tagged_recipes(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        touch_recipes(pk=instance.pk)
+    elif pk_set:
+        touch_recipes(pk__in=pk_set)
+    else:
+        touch_recipes(tags=instance)
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(instance, created, update_fields, **kwargs):
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    touch_recipes(author=instance)
@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+
+User = get_user_model()
+
+# Копии изображения считаются готовыми, файл для тестов не нужен.
+IMAGE = 'recipe_images/test.png'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+)
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@foodgram.ru', password='pass')
+
+
+def create_tags():
+    return [
+        Tag.objects.create(name=name, color=color, slug=slug)
+        for name, color, slug in TAGS
+    ]
+
+
+def create_ingredients(count):
+    return [
+        Ingredient.objects.create(
+            name=f'ингредиент {number}', measurement_unit='г')
+        for number in range(count)
+    ]
+
+
+def create_recipe(author, ingredients=(), tags=(), **fields):
+    """Рецепт с ингредиентами по 100 г."""
+    recipe = Recipe.objects.create(**{
+        'author': author,
+        'name': 'Рецепт',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'image': IMAGE,
+        'renditions_source': IMAGE,
+        **fields,
+    })
+    recipe.tags.set(tags)
+    IngredientAmount.objects.bulk_create([
+        IngredientAmount(recipe=recipe, ingredients=ingredient, amount=100)
+        for ingredient in ingredients
+    ])
+    return recipe
+
+
+class APITestCase(TestCase):
+    """Пользователь user, автор рецептов author и клиент API от имени user."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
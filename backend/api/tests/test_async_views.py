@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import SimpleTestCase
+
+from api.async_views import StreamingASGIHandler
+
+
+class StreamingASGIHandlerTest(SimpleTestCase):
+    """Отправка ответов ASGI-обработчиком."""
+
+    def send_response(self, response, messages=None):
+        messages = [] if messages is None else messages
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(StreamingASGIHandler().send_response(response, send))
+        return messages
+
+    def test_streaming_response_is_sent_by_parts(self):
+        loop_thread = threading.current_thread()
+        threads = set()
+        messages = []
+        sent = []
+
+        def rows():
+            for number in range(3):
+                threads.add(threading.current_thread())
+                # Предыдущая часть уже отправлена клиенту.
+                sent.append(len(messages))
+                yield f'{number}\n'.encode()
+
+        response = StreamingHttpResponse(
+            rows(), content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="list.txt"'
+        response.set_cookie('seen', '1')
+        start, *body, end = self.send_response(response, messages)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'Content-Disposition',
+                       b'attachment; filename="list.txt"'), start['headers'])
+        self.assertIn(b'Set-Cookie', dict(start['headers']))
+        self.assertEqual(
+            [message['body'] for message in body], [b'0\n', b'1\n', b'2\n'])
+        self.assertTrue(all(message['more_body'] for message in body))
+        self.assertEqual(end, {'type': 'http.response.body'})
+        self.assertEqual(sent, [1, 2, 3])
+        self.assertEqual(len(threads), 1)
+        self.assertNotIn(loop_thread, threads)
+
+    def test_regular_response(self):
+        start, body = self.send_response(HttpResponse(b'ok'))
+        self.assertEqual(start['status'], 200)
+        self.assertEqual(body['body'], b'ok')
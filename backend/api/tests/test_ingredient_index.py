@@ -0,0 +1,23 @@
+from django.core.cache import cache
+
+from api.cache import ingredients_cache
+from api.search import IngredientIndex
+from recipes.models import Ingredient
+from . import APITestCase
+
+
+class IngredientIndexTest(APITestCase):
+    """Автодополнение ингредиентов в разных процессах."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_other_process_sees_new_ingredient(self):
+        # Индекс другого процесса: сигналы сбрасывают только свой.
+        index = IngredientIndex(ingredients_cache.version_key)
+        self.assertEqual(index.search('мол'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='молоко', measurement_unit='мл')
+        self.assertEqual(
+            [item['name'] for item in index.search('мол')], ['молоко'])
@@ -0,0 +1,32 @@
+from django.test import TestCase, override_settings
+
+from . import create_user
+
+
+@override_settings(PERFORMANCE_METRICS=True, PERFORMANCE_METRICS_TOKEN='secret')
+class MetricsTest(TestCase):
+    """Доступ к /metrics."""
+
+    def test_anonymous_is_forbidden(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+    def test_token(self):
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin(self):
+        admin = create_user('admin')
+        admin.is_staff = True
+        admin.save()
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(PERFORMANCE_METRICS=False)
+    def test_disabled(self):
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,41 @@
+from unittest import mock
+
+from django.core.cache import cache
+
+from api.search import PantryIndex
+from recipes.models import IngredientAmount
+from . import APITestCase, create_ingredients, create_recipe
+
+
+class PantryIndexTest(APITestCase):
+    """Обновление матрицы состава рецептов в разных процессах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ingredients = create_ingredients(2)
+        cls.recipe = create_recipe(cls.author, cls.ingredients[:1])
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        # Два индекса изображают два процесса с общим кэшем.
+        self.writer, self.reader = PantryIndex(), PantryIndex()
+        for index in (self.writer, self.reader):
+            index.match([self.ingredients[0].pk])
+        IngredientAmount.objects.create(
+            recipe=self.recipe, ingredients=self.ingredients[1], amount=1)
+
+    def test_writer_does_not_rebuild(self):
+        self.writer.update([self.recipe.pk])
+        with mock.patch('api.search.executor') as executor:
+            result = self.writer.match([self.ingredients[0].pk])
+        executor.submit.assert_not_called()
+        self.assertEqual(
+            result, [(self.recipe.pk, 0.5, [self.ingredients[1].pk])])
+
+    def test_other_process_rebuilds(self):
+        self.writer.update([self.recipe.pk])
+        with mock.patch('api.search.executor') as executor:
+            self.reader.match([self.ingredients[0].pk])
+        executor.submit.assert_called_once()
@@ -0,0 +1,54 @@
+from api.services import insert_new
+from recipes.models import Cart, CartIngredientTotal, Favorite, Recipe
+from . import APITestCase, create_ingredients, create_recipe
+
+
+class RecipeBatchTest(APITestCase):
+    """Добавление и удаление рецептов в избранном и корзине пачкой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        ingredients = create_ingredients(1)
+        cls.recipes = [
+            create_recipe(cls.author, ingredients, name=f'Рецепт {number}')
+            for number in range(3)
+        ]
+        for recipe in cls.recipes:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            Cart.objects.create(user=cls.user, recipe=recipe)
+
+    def delete_batch(self, url):
+        return self.client.delete(
+            url, {'recipes': [recipe.pk for recipe in self.recipes[:2]]},
+            format='json')
+
+    def test_delete_favorites(self):
+        response = self.delete_batch('/api/recipes/favorite/batch/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            list(Recipe.objects.order_by('pk').values_list(
+                'favorites_count', flat=True)),
+            [0, 0, 1])
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 1)
+
+    def test_delete_from_cart(self):
+        response = self.delete_batch('/api/recipes/shopping_cart/batch/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            list(Recipe.objects.order_by('pk').values_list(
+                'in_carts_count', flat=True)),
+            [0, 0, 1])
+        total = CartIngredientTotal.objects.get(user=self.user)
+        self.assertEqual(total.amount, 100)
+
+    def test_insert_skips_rows_added_concurrently(self):
+        recipe = create_recipe(self.author)
+        # Запись, добавленная параллельным запросом после проверки.
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        new = create_recipe(self.author)
+        inserted = insert_new([
+            Favorite(user=self.user, recipe=recipe),
+            Favorite(user=self.user, recipe=new),
+        ])
+        self.assertEqual([obj.recipe for obj in inserted], [new])
@@ -0,0 +1,51 @@
+from recipes.models import Cart, Favorite, Recipe
+from users.models import Follow, UserStats
+from . import APITestCase, create_recipe
+
+
+class RecipeCountersTest(APITestCase):
+    """Денормализованные счётчики рецептов и пользователей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipe = create_recipe(cls.author)
+
+    def test_save_keeps_counters_changed_concurrently(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def delete_twice(self, model, **fields):
+        """Удаляет одну строку из двух копий, как два параллельных DELETE."""
+        model.objects.create(**fields)
+        first, second = model.objects.get(**fields), model.objects.get(**fields)
+        first.delete()
+        second.delete()
+
+    def test_favorite_deleted_twice(self):
+        self.delete_twice(Favorite, user=self.user, recipe=self.recipe)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_cart_deleted_twice(self):
+        self.delete_twice(Cart, user=self.user, recipe=self.recipe)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.in_carts_count, 0)
+
+    def test_recipe_deleted_twice(self):
+        first = Recipe.objects.get(pk=self.recipe.pk)
+        second = Recipe.objects.get(pk=self.recipe.pk)
+        first.delete()
+        second.delete()
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).recipes_count, 0)
+
+    def test_follow_deleted_twice(self):
+        self.delete_twice(Follow, user=self.user, author=self.author)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0)
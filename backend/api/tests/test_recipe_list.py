@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe, Tag
+from . import (
+    APITestCase, create_ingredients, create_recipe, create_tags, create_user
+)
+
+
+class RecipeListTest(APITestCase):
+    """Список рецептов из кэша."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        authors = [cls.author, create_user('author1'), create_user('author2')]
+        tags = create_tags()
+        ingredients = create_ingredients(3)
+        for number in range(60):
+            create_recipe(
+                authors[number % len(authors)], ingredients, tags,
+                name=f'Рецепт {number}')
+
+    def get_page(self, limit):
+        # Кэш рецептов очищается, чтобы сериализация выполнялась заново.
+        cache.clear()
+        response = self.client.get(f'/api/recipes/?limit={limit}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_page(6)
+        with self.assertNumQueries(len(queries)):
+            self.get_page(50)
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def test_cached_image_urls_do_not_depend_on_host(self):
+        cache.clear()
+        self.client.get('/api/recipes/?limit=6', HTTP_HOST='cdn.example.com')
+        response = self.client.get(
+            '/api/recipes/?limit=6', HTTP_HOST='foodgram.ru')
+        for recipe in response.data['results']:
+            for field in ('image', 'thumbnail', 'medium'):
+                self.assertTrue(
+                    recipe[field].startswith('http://foodgram.ru/media/'))
+
+    def test_filter_by_tag_unknown_to_cache(self):
+        cache.clear()
+        self.client.get('/api/recipes/?tags=breakfast')
+        # bulk_create не вызывает сигналы и не сбрасывает кэш слагов,
+        # как и создание тега в другом процессе.
+        Tag.objects.bulk_create([
+            Tag(name='Ужин', color='#8775D2', slug='dinner')])
+        tag = Tag.objects.get(slug='dinner')
+        Recipe.objects.first().tags.add(tag)
+        response = self.client.get('/api/recipes/?tags=dinner')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_search_with_cursor_keeps_rank_order(self):
+        by_name = create_recipe(self.author, name='Борщ')
+        create_recipe(self.author, name='Суп', text='Почти борщ')
+        response = self.client.get('/api/recipes/?search=борщ&cursor=')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['results'][0]['id'], by_name.pk)
@@ -0,0 +1,50 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import IngredientAmount
+from . import APITestCase, create_ingredients, create_recipe, create_tags
+
+
+class RecipeUpdateTest(APITestCase):
+    """Редактирование рецепта без изменения состава."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tags = create_tags()
+        cls.ingredients = create_ingredients(30)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.author)
+
+    def patch_unchanged(self, recipe, ingredients):
+        """PATCH с прежними тегами и составом рецепта."""
+        payload = {
+            'name': 'Новое название',
+            'text': 'Описание',
+            'cooking_time': 15,
+            'tags': [tag.pk for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 100}
+                for ingredient in ingredients
+            ],
+        }
+        response = self.client.patch(
+            f'/api/recipes/{recipe.pk}/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_query_count_does_not_depend_on_ingredients(self):
+        small = create_recipe(self.author, self.ingredients[:3], self.tags)
+        large = create_recipe(self.author, self.ingredients, self.tags)
+        with CaptureQueriesContext(connection) as queries:
+            self.patch_unchanged(small, self.ingredients[:3])
+        with self.assertNumQueries(len(queries)):
+            self.patch_unchanged(large, self.ingredients)
+
+    def test_unchanged_ingredients_are_kept(self):
+        recipe = create_recipe(self.author, self.ingredients, self.tags)
+        amounts = IngredientAmount.objects.filter(recipe=recipe)
+        pks = set(amounts.values_list('pk', flat=True))
+        self.patch_unchanged(recipe, self.ingredients)
+        self.assertEqual(set(amounts.values_list('pk', flat=True)), pks)
@@ -0,0 +1,278 @@
+import json
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_datetime
+
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from recipes.signals import link_units, recount
+from .cache import ingredients_cache
+from .search import ingredient_index, schedule_reindex
+
+User = get_user_model()
+
+DEFAULT_BATCH_SIZE = 1000
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+class TransferError(ValueError):
+    """Ошибка в строке NDJSON с рецептами."""
+
+    def __init__(self, line, message):
+        super().__init__(f'Строка {line}: {message}')
+        self.line = line
+
+
+def dump_recipe(recipe):
+    """Рецепт в виде словаря для строки NDJSON.
+
+    Ингредиенты и теги ссылаются на записи по названию и слагу, а не по
+    id, поэтому файл можно загрузить в другую базу.
+    """
+    data = {
+        'id': recipe.pk,
+        'author': recipe.author.email if recipe.author else None,
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date.isoformat(),
+        'image': recipe.image.name,
+        'tags': [tag.slug for tag in recipe.tags.all()],
+        'ingredients': [
+            [amount.ingredients.name, amount.ingredients.measurement_unit,
+             amount.amount]
+            for amount in recipe.ingredient.all()
+        ],
+    }
+    if recipe.image and recipe.renditions_source == recipe.image.name:
+        data['thumbnail'] = recipe.thumbnail.name
+        data['medium'] = recipe.medium.name
+    return data
+
+
+def export_recipes(queryset=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Строки NDJSON с рецептами, по одному рецепту в строке.
+
+    Рецепты читаются пачками по первичному ключу, поэтому в памяти
+    держится только одна пачка вместе с её ингредиентами и тегами.
+    """
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    queryset = queryset.select_related('author').prefetch_related(
+        'tags',
+        Prefetch('ingredient', queryset=IngredientAmount.objects
+                 .select_related('ingredients').order_by('pk')),
+    ).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        for recipe in batch:
+            yield json.dumps(
+                dump_recipe(recipe), ensure_ascii=False,
+                separators=(',', ':')) + '\n'
+        last_pk = batch[-1].pk
+
+
+def _check(condition, line, message):
+    if not condition:
+        raise TransferError(line, message)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_ingredients(line, ingredients):
+    _check(isinstance(ingredients, list), line,
+           'ingredients должно быть списком')
+    keys = set()
+    for ingredient in ingredients:
+        _check(isinstance(ingredient, list) and len(ingredient) == 3, line,
+               'ингредиент задаётся списком [название, единицы, количество]')
+        name, unit, amount = ingredient
+        _check(isinstance(name, str) and isinstance(unit, str), line,
+               'название и единицы ингредиента должны быть строками')
+        _check(_is_number(amount) and amount >= 0.1, line,
+               f'некорректное количество ингредиента {name}')
+        _check((name, unit) not in keys, line,
+               f'ингредиент {name} указан дважды')
+        keys.add((name, unit))
+
+
+def validate_item(line, item):
+    """Проверяет поля рецепта так же, как ограничения моделей."""
+    _check(isinstance(item, dict), line, 'ожидается объект JSON')
+    name = item.get('name')
+    _check(isinstance(name, str) and 0 < len(name) <= 200, line,
+           'некорректное название рецепта')
+    _check(isinstance(item.get('text'), str), line, 'нет описания рецепта')
+    cooking_time = item.get('cooking_time')
+    _check(isinstance(cooking_time, int) and 1 <= cooking_time <= 32767,
+           line, 'некорректное время приготовления')
+    _check(isinstance(item.get('image', ''), str), line,
+           'image должно быть путём к файлу')
+    tags = item.get('tags', [])
+    _check(isinstance(tags, list)
+           and all(isinstance(tag, str) for tag in tags),
+           line, 'tags должно быть списком слагов')
+    validate_ingredients(line, item.get('ingredients'))
+    pub_date = item.get('pub_date')
+    if pub_date is not None:
+        item['pub_date'] = parse_datetime(str(pub_date))
+        _check(item['pub_date'] is not None, line,
+               'некорректная дата публикации')
+    return item
+
+
+def parse_lines(lines):
+    """Пары (номер строки, рецепт) из NDJSON, пустые строки пропускаются."""
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as error:
+            raise TransferError(number, f'некорректный JSON ({error})')
+        yield number, validate_item(number, item)
+
+
+class RecipeImporter:
+    """Загружает рецепты из NDJSON пачками по batch_size.
+
+    Каждая пачка записывается в своей транзакции несколькими bulk_create.
+    Ингредиенты и теги сопоставляются с записями базы по названию и
+    слагу, недостающие ингредиенты создаются, неизвестные теги
+    пропускаются. Авторы ищутся по email, ненайденные заменяются на
+    default_author, а без него строка считается ошибкой.
+    """
+
+    def __init__(self, default_author=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.default_author = default_author
+        self.batch_size = batch_size
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('pk', 'name', 'measurement_unit')
+        }
+        self.tags = dict(Tag.objects.values_list('slug', 'pk'))
+        self.authors = {}
+        self.recipes = 0
+        self.created_ingredients = 0
+        self.unknown_tags = set()
+
+    def run(self, lines):
+        items = parse_lines(lines)
+        try:
+            while True:
+                batch = list(islice(items, self.batch_size))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    self.import_batch(batch)
+        finally:
+            if self.created_ingredients:
+                ingredient_index.invalidate()
+                ingredients_cache.bump()
+
+    def import_batch(self, batch):
+        items = [item for _, item in batch]
+        self.add_ingredients(items)
+        self.load_authors(batch)
+        recipes = [self.build_recipe(item) for item in items]
+        self.insert(recipes)
+        dated = []
+        for recipe, item in zip(recipes, items):
+            if item.get('pub_date'):
+                recipe.pub_date = item['pub_date']
+                dated.append(recipe)
+        # bulk_create проставляет pub_date = now() из-за auto_now_add.
+        Recipe.objects.bulk_update(dated, ['pub_date'])
+        IngredientAmount.objects.bulk_create([
+            IngredientAmount(
+                recipe=recipe, amount=amount,
+                ingredients_id=self.ingredients[name, unit])
+            for recipe, item in zip(recipes, items)
+            for name, unit, amount in item['ingredients']
+        ])
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+            for recipe, item in zip(recipes, items)
+            for tag_id in self.get_tag_ids(item)
+        ])
+        recount(Recipe, {recipe.author_id for recipe in recipes})
+        schedule_reindex([recipe.pk for recipe in recipes])
+        self.recipes += len(recipes)
+
+    def add_ingredients(self, items):
+        missing = {
+            (name, unit)
+            for item in items for name, unit, _ in item['ingredients']
+        } - self.ingredients.keys()
+        if not missing:
+            return
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in missing],
+            ignore_conflicts=True,
+        )
+        created = Ingredient.objects.filter(
+            name__in={name for name, _ in missing})
+        link_units(created.filter(unit__isnull=True))
+        for pk, name, unit in created.values_list(
+                'pk', 'name', 'measurement_unit'):
+            self.ingredients[name, unit] = pk
+        self.created_ingredients += len(missing)
+
+    def load_authors(self, batch):
+        emails = {item.get('author') for _, item in batch} - {None}
+        emails -= self.authors.keys()
+        found = dict(User.objects.filter(
+            email__in=emails).values_list('email', 'pk'))
+        for email in emails:
+            self.authors[email] = found.get(email)
+        if self.default_author is not None:
+            return
+        for line, item in batch:
+            _check(self.authors.get(item.get('author')) is not None, line,
+                   f'автор {item.get("author")} не найден')
+
+    def get_tag_ids(self, item):
+        tag_ids = set()
+        for slug in item.get('tags', []):
+            if slug in self.tags:
+                tag_ids.add(self.tags[slug])
+            else:
+                self.unknown_tags.add(slug)
+        return tag_ids
+
+    def build_recipe(self, item):
+        author_id = self.authors.get(item.get('author'))
+        recipe = Recipe(
+            author_id=author_id or self.default_author.pk,
+            name=item['name'],
+            text=item['text'],
+            cooking_time=item['cooking_time'],
+            image=item.get('image', ''),
+        )
+        if 'thumbnail' in item:
+            recipe.thumbnail = item['thumbnail']
+            recipe.medium = item.get('medium', '')
+            recipe.renditions_source = recipe.image.name
+        return recipe
+
+    def insert(self, recipes):
+        Recipe.objects.bulk_create(recipes)
+        if connection.features.can_return_rows_from_bulk_insert:
+            return
+        # SQLite не возвращает id из bulk_create. Внутри транзакции база
+        # заблокирована на запись, и новые записи получают подряд идущие
+        # id, большие всех существующих.
+        pks = Recipe.objects.order_by('-pk').values_list(
+            'pk', flat=True)[:len(recipes)]
+        for recipe, pk in zip(recipes, reversed(list(pks))):
+            recipe.pk = pk
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api.async_views import async_patterns
 from api.views import (
     FollowViewSet, IngredientsViewSet, RecipeViewSet,
     TagsViewSet
@@ -14,8 +16,12 @@ router.register('ingredients', IngredientsViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('users', FollowViewSet, basename='users')
 
+router_urls = router.urls
+if settings.ASYNC_VIEWS:
+    router_urls = async_patterns(router_urls)
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(router_urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
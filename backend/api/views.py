@@ -1,44 +1,118 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.db.models import BooleanField, Exists, OuterRef, Value
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    BooleanField, Exists, OuterRef, Prefetch, Subquery, Value
+)
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
 from djoser.views import UserViewSet
 from rest_framework import viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import (
+    SAFE_METHODS, IsAdminUser, IsAuthenticated
+)
 from rest_framework.response import Response
 
 from recipes.models import (
-    Cart, Favorite, Ingredient, Recipe, Tag
+    Cart, CartIngredientTotal, Favorite, Ingredient, IngredientAmount,
+    Recipe, Tag
 )
 from users.models import Follow
-from .filters import IngredientSearchFilter, RecipeFilter
-from .pagination import LimitPageNumberPagination
+from .cache import (
+    get_recipes_data, ingredients_cache, render_json, tags_cache
+)
+from .filters import RecipeFilter
+from .metrics import registry
+from .pagination import (
+    LimitPageNumberPagination, RankedPagination, RecipePagination
+)
+from .parsers import NDJSONParser
 from .permissions import AdminOrReadOnly, AdminUserOrReadOnly
+from .renderers import ShopListCSVRenderer, ShopListTextRenderer
+from .search import ingredient_index, pantry_index
 from .serializers import (
-    CustomUserSerializer, FollowSerializer, IngredientSerializer,
-    RecipeReadSerializer, RecipeWriteSerializer, ShortRecipeSerializer,
-    TagSerializer
+    CartIngredientTotalSerializer, CustomUserSerializer, FollowSerializer,
+    IngredientSerializer,
+    PantryRecipeSerializer, PantrySerializer, RecipeReadSerializer,
+    RecipeIdsSerializer, RecipeWriteSerializer, ShortRecipeSerializer,
+    TagSerializer, get_recipes_limit
+)
+from .services import (
+    add_recipes, generate_shop_list, get_recommended, remove_recipes
+)
+from .transfer import (
+    NDJSON_CONTENT_TYPE, RecipeImporter, TransferError, export_recipes
 )
-from .services import generate_shop_list
 
 User = get_user_model()
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class ReferenceViewSet(viewsets.ReadOnlyModelViewSet):
+    """Справочник, который отдаётся из ReferenceCache.
+
+    JSON-ответы получают ETag и Last-Modified, на условные запросы с
+    актуальной версией отвечаем 304 без тела.
+    """
     permission_classes = (AdminOrReadOnly,)
+    filter_backends = ()
+    reference_cache = None
+
+    def conditional_response(self, data, modified, body=None, etag=None):
+        if self.request.accepted_renderer.format != 'json':
+            return Response(data)
+        if body is None:
+            body, etag = render_json(data)
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=int(modified)
+        ) or HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modified)
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        reference = self.reference_cache.get()
+        return self.conditional_response(
+            reference.data, reference.modified,
+            reference.body, reference.etag
+        )
+
+    def retrieve(self, request, pk=None, *args, **kwargs):
+        reference = self.reference_cache.get()
+        if pk not in reference.items:
+            raise NotFound()
+        return self.conditional_response(
+            reference.items[pk], reference.modified
+        )
+
+
+class TagsViewSet(ReferenceViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    reference_cache = tags_cache
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
-    permission_classes = (AdminOrReadOnly,)
+class IngredientsViewSet(ReferenceViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
+    reference_cache = ingredients_cache
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return self.conditional_response(
+                ingredient_index.search(name),
+                self.reference_cache.get().modified
+            )
+        return super().list(request, *args, **kwargs)
 
 
 class FollowViewSet(UserViewSet):
@@ -75,7 +149,20 @@ class FollowViewSet(UserViewSet):
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         user = request.user
-        queryset = Follow.objects.filter(user=user)
+        recipes = Recipe.objects.all()
+        limit = get_recipes_limit(request)
+        if limit:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('pk')[:limit]
+            ))
+        queryset = Follow.objects.filter(user=user).select_related(
+            'author__stats'
+        ).prefetch_related(
+            Prefetch('author__recipes', queryset=recipes,
+                     to_attr='limited_recipes')
+        )
         pages = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
             pages, many=True,
@@ -85,8 +172,8 @@ class FollowViewSet(UserViewSet):
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
-    pagination_class = LimitPageNumberPagination
-    filter_class = RecipeFilter
+    pagination_class = RecipePagination
+    filterset_class = RecipeFilter
     permission_classes = (AdminUserOrReadOnly,)
 
     def get_serializer_class(self):
@@ -96,23 +183,75 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        queryset = Recipe.objects.all()
-
-        if user.is_authenticated:
-            queryset = queryset.annotate(
-                is_favorited=Exists(Favorite.objects.filter(
-                    user=user, recipe__pk=OuterRef('pk'))
-                ),
-                is_in_shopping_cart=Exists(Cart.objects.filter(
-                    user=user, recipe__pk=OuterRef('pk'))
-                )
-            )
-        else:
-            queryset = queryset.annotate(
+        if user.is_anonymous:
+            return Recipe.objects.annotate(
                 is_favorited=Value(False, output_field=BooleanField()),
-                is_in_shopping_cart=Value(False, output_field=BooleanField())
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                is_subscribed=Value(False, output_field=BooleanField())
             )
-        return queryset
+        return Recipe.objects.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe__pk=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(Cart.objects.filter(
+                user=user, recipe__pk=OuterRef('pk'))
+            ),
+            is_subscribed=Exists(Follow.objects.filter(
+                user=user, author__pk=OuterRef('author'))
+            )
+        )
+
+    def serialize_recipes(self, pks):
+        """Сериализует общую для всех пользователей часть рецептов.
+
+        Запрос в контекст не передаётся, чтобы в кэш не попали URL с
+        хостом из заголовка запроса.
+        """
+        authors = User.objects.annotate(
+            is_subscribed=Value(False, output_field=BooleanField())
+        )
+        queryset = Recipe.objects.filter(pk__in=pks).prefetch_related(
+            'tags',
+            Prefetch('author', queryset=authors),
+            Prefetch(
+                'ingredient',
+                queryset=IngredientAmount.objects.select_related(
+                    'ingredients').order_by('ingredients__name')
+            ),
+        )
+        serializer = RecipeReadSerializer(queryset, many=True)
+        return {item['id']: item for item in serializer.data}
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(
+            get_recipes_data(page, self.serialize_recipes, request)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe = self.get_object()
+        return Response(
+            get_recipes_data([recipe], self.serialize_recipes, request)[0]
+        )
+
+    @action(detail=False, permission_classes=[IsAuthenticated],
+            pagination_class=RankedPagination)
+    def recommended(self, request):
+        """Рецепты, похожие на избранное и корзину, и рецепты подписок.
+
+        Похожие рецепты заранее рассчитываются командой
+        build_recommendations. Пока рекомендовать нечего, отдаются
+        самые популярные рецепты.
+        """
+        recommended, popular = get_recommended(
+            self.get_queryset(), request.user)
+        page = self.paginate_queryset(recommended)
+        if self.paginator.page.paginator.count == 0:
+            page = self.paginate_queryset(popular)
+        return self.get_paginated_response(
+            get_recipes_data(page, self.serialize_recipes, request)
+        )
 
     @action(detail=True, methods=['post'],
             permission_classes=[IsAuthenticated])
@@ -132,28 +271,176 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def del_from_shopping_cart(self, request, pk=None):
         return self.__delete_obj(Cart, request.user, pk)
 
+    @action(detail=False, methods=['post'],
+            permission_classes=[IsAuthenticated],
+            url_path='favorite/batch', url_name='favorite-batch')
+    def favorite_batch(self, request):
+        return self.__add_batch(Favorite, request)
+
+    @favorite_batch.mapping.delete
+    def del_from_favorite_batch(self, request):
+        return self.__delete_batch(Favorite, request)
+
+    @action(detail=False, methods=['post'],
+            permission_classes=[IsAuthenticated],
+            url_path='shopping_cart/batch', url_name='shopping-cart-batch')
+    def shopping_cart_batch(self, request):
+        return self.__add_batch(Cart, request)
+
+    @shopping_cart_batch.mapping.delete
+    def del_from_shopping_cart_batch(self, request):
+        return self.__delete_batch(Cart, request)
+
+    @action(detail=False, permission_classes=[IsAuthenticated],
+            url_path='shopping_cart/totals', url_name='shopping-cart-totals')
+    def shopping_cart_totals(self, request):
+        """Текущие суммы ингредиентов в корзине для показа в интерфейсе."""
+        totals = CartIngredientTotal.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        return Response(
+            CartIngredientTotalSerializer(totals, many=True).data)
+
     @staticmethod
     def __add_obj(model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
+        recipe = get_object_or_404(Recipe, id=pk)
+        try:
+            with transaction.atomic():
+                model.objects.create(user=user, recipe=recipe)
+        except IntegrityError:
             return Response({
                 'errors': 'Ошибка добавления рецепта в список'
             }, status=HTTPStatus.BAD_REQUEST)
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
         serializer = ShortRecipeSerializer(recipe)
         return Response(serializer.data, status=HTTPStatus.CREATED)
 
     @staticmethod
     def __delete_obj(model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        deleted, _ = model.objects.filter(user=user, recipe__id=pk).delete()
+        if deleted:
             return Response(status=HTTPStatus.NO_CONTENT)
         return Response({
             'errors': 'Ошибка удаления рецепта из списка'
         }, status=HTTPStatus.BAD_REQUEST)
 
-    @action(detail=False, permission_classes=[IsAuthenticated])
+    @staticmethod
+    def __add_batch(model, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        added = add_recipes(
+            model, request.user, serializer.validated_data['recipes'])
+        return Response(
+            ShortRecipeSerializer(added, many=True).data,
+            status=HTTPStatus.CREATED
+        )
+
+    @staticmethod
+    def __delete_batch(model, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if remove_recipes(
+                model, request.user, serializer.validated_data['recipes']):
+            return Response(status=HTTPStatus.NO_CONTENT)
+        return Response({
+            'errors': 'Ошибка удаления рецептов из списка'
+        }, status=HTTPStatus.BAD_REQUEST)
+
+    @action(detail=False, methods=['post'],
+            permission_classes=[IsAuthenticated],
+            pagination_class=RankedPagination)
+    def pantry(self, request):
+        """Рецепты, которые можно приготовить из имеющихся продуктов."""
+        serializer = PantrySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        page = self.paginate_queryset(pantry_index.match(
+            serializer.validated_data['ingredients'],
+            serializer.validated_data['min_coverage'],
+        ))
+        recipes = Recipe.objects.in_bulk(
+            [recipe_id for recipe_id, _, _ in page])
+        missing = Ingredient.objects.in_bulk({
+            ingredient_id
+            for _, _, ingredient_ids in page for ingredient_id in ingredient_ids
+        })
+        result = []
+        for recipe_id, coverage, ingredient_ids in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.coverage = round(coverage, 4)
+            recipe.missing = [
+                missing[pk] for pk in ingredient_ids if pk in missing]
+            result.append(recipe)
+        return self.get_paginated_response(PantryRecipeSerializer(
+            result, many=True, context={'request': request}
+        ).data)
+
+    @action(detail=False, permission_classes=[IsAdminUser],
+            url_path='export', url_name='export')
+    def bulk_export(self, request):
+        """Все рецепты в NDJSON, по одному рецепту в строке."""
+        response = StreamingHttpResponse(
+            export_recipes(), content_type=NDJSON_CONTENT_TYPE)
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"')
+        return response
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser],
+            parser_classes=[NDJSONParser],
+            url_path='import', url_name='import')
+    def bulk_import(self, request):
+        """Загружает рецепты из NDJSON в формате выгрузки.
+
+        Рецепты с неизвестным автором записываются на текущего
+        пользователя.
+        """
+        importer = RecipeImporter(default_author=request.user)
+        try:
+            importer.run(request.data)
+        except TransferError as error:
+            return Response({
+                'errors': str(error), 'recipes': importer.recipes
+            }, status=HTTPStatus.BAD_REQUEST)
+        return Response({
+            'recipes': importer.recipes,
+            'ingredients': importer.created_ingredients,
+            'unknown_tags': sorted(importer.unknown_tags),
+        }, status=HTTPStatus.CREATED)
+
+    @action(detail=False, permission_classes=[IsAuthenticated],
+            renderer_classes=[ShopListTextRenderer, ShopListCSVRenderer])
     def download_shopping_cart(self, request):
-        shop_list = generate_shop_list(request.user)
-        return HttpResponse(shop_list, content_type='text/plain')
+        user = request.user
+        if not Cart.objects.filter(user=user).exists():
+            return Response({'errors': 'Ваша корзина пуста'},
+                            status=HTTPStatus.BAD_REQUEST)
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            generate_shop_list(user, renderer),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"'
+        )
+        return response
+
+
+def metrics(request):
+    """Метрики процесса в формате Prometheus.
+
+    Доступны администраторам и запросам с заголовком
+    Authorization: Bearer <PERFORMANCE_METRICS_TOKEN>.
+    """
+    if not settings.PERFORMANCE_METRICS:
+        raise Http404
+    token = settings.PERFORMANCE_METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if not (
+        request.user.is_staff
+        or token and constant_time_compare(authorization, f'Bearer {token}')
+    ):
+        raise PermissionDenied
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,10 @@
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup(set_prefix=False)
+
+from api.async_views import StreamingASGIHandler  # noqa: E402
+
+application = StreamingASGIHandler()
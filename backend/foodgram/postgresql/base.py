@@ -0,0 +1,148 @@
+import os
+from functools import partial
+from queue import Empty, LifoQueue
+from threading import BoundedSemaphore, Lock
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+Database = base.Database
+
+_pools = {}
+_pools_lock = Lock()
+
+
+class ConnectionPool:
+    """Пул соединений с PostgreSQL внутри процесса.
+
+    Держит до size простаивающих соединений и не больше size +
+    max_overflow открытых одновременно. Если свободных соединений нет
+    дольше timeout секунд, поднимает OperationalError.
+    """
+
+    def __init__(self, connect, size, max_overflow, timeout,
+                 health_checks):
+        self._connect = connect
+        self._size = size
+        self._timeout = timeout
+        self._health_checks = health_checks
+        self._idle = LifoQueue()
+        self._slots = BoundedSemaphore(size + max_overflow)
+
+    @staticmethod
+    def _is_usable(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Database.Error:
+            return False
+        return True
+
+    def _take_idle(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except Empty:
+                return None
+            if connection.closed:
+                continue
+            if self._health_checks and not self._is_usable(connection):
+                connection.close()
+                continue
+            return connection
+
+    def get(self):
+        if not self._slots.acquire(timeout=self._timeout):
+            raise Database.OperationalError(
+                'Нет свободных соединений в пуле')
+        try:
+            return self._take_idle() or self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def put(self, connection):
+        try:
+            if not connection.closed:
+                status = connection.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    connection.close()
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            if connection.closed or self._idle.qsize() >= self._size:
+                connection.close()
+            else:
+                self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с проверкой постоянных соединений и пулом.
+
+    Дополнительные ключи настроек БД:
+    CONN_HEALTH_CHECKS — перед первым запросом в каждом HTTP-запросе
+    проверять, что постоянное соединение живо;
+    POOL — словарь SIZE, MAX_OVERFLOW и TIMEOUT, чтобы брать соединения
+    из пула процесса вместо открытия нового (вместе с CONN_MAX_AGE = 0).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+
+    @property
+    def health_checks(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def get_pool(self, conn_params):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        # После fork у рабочего процесса gunicorn должен быть свой пул.
+        key = (self.alias, os.getpid())
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(
+                    partial(super().get_new_connection, conn_params),
+                    size=options.get('SIZE', 4),
+                    max_overflow=options.get('MAX_OVERFLOW', 4),
+                    timeout=options.get('TIMEOUT', 10),
+                    health_checks=self.health_checks,
+                )
+            return _pools[key]
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.get()
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        pool = _pools.get((self.alias, os.getpid()))
+        if pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.put(self.connection)
+
+    def connect(self):
+        # Новое соединение проверять не нужно, а set_autocommit внутри
+        # connect() вызывает ensure_connection.
+        self.health_check_done = True
+        super().connect()
+
+    def ensure_connection(self):
+        if (self.connection is not None and self.health_checks
+                and not self.health_check_done
+                and not self.in_atomic_block):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
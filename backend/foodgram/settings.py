@@ -31,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -60,18 +61,48 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
+ASGI_APPLICATION = 'foodgram.asgi.application'
 
+# Включается в foodgram/asgi.py: горячие эндпоинты чтения обслуживаются
+# async-представлениями.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', default='0') == '1'
+
+
+DB_POOL = os.getenv('DB_POOL', default='0') == '1'
 
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv(
-            'DB_ENGINE', default='django.db.backends.postgresql'
-        ),
+        'ENGINE': os.getenv('DB_ENGINE', default='foodgram.postgresql'),
         'NAME': os.getenv('DB_NAME', default='postgres'),
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres1'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        # В режиме пула соединение возвращается в пул после каждого
+        # запроса, а не держится рабочим процессом.
+        'CONN_MAX_AGE': 0 if DB_POOL else int(
+            os.getenv('DB_CONN_MAX_AGE', default='60')),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', default='1') == '1',
+        'POOL': {
+            'SIZE': int(os.getenv('DB_POOL_SIZE', default='4')),
+            'MAX_OVERFLOW': int(
+                os.getenv('DB_POOL_MAX_OVERFLOW', default='4')),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default='10')),
+        } if DB_POOL else None,
+        # Нужно при работе через pgbouncer в режиме transaction.
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_DISABLE_SERVER_SIDE_CURSORS', default='0') == '1',
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
     }
 }
 
@@ -109,6 +140,27 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+IMAGE_PROCESSING_ASYNC = os.getenv(
+    'IMAGE_PROCESSING_ASYNC', default='1') == '1'
+
+PERFORMANCE_METRICS = os.getenv('PERFORMANCE_METRICS', default='0') == '1'
+# Токен, с которым Prometheus читает /metrics. Без него метрики видны
+# только администраторам.
+PERFORMANCE_METRICS_TOKEN = os.getenv('PERFORMANCE_METRICS_TOKEN', default='')
+PERFORMANCE_SERVER_TIMING = os.getenv(
+    'PERFORMANCE_SERVER_TIMING', default='1') == '1'
+# Пороги, после которых запрос попадает в лог с предупреждением: время в
+# секундах, число SQL-запросов и число повторов одного SQL. Для отдельных
+# маршрутов можно задать свои значения по имени маршрута.
+PERFORMANCE_BUDGETS = {
+    'default': {
+        'time': float(os.getenv('PERFORMANCE_BUDGET_TIME', default='0.5')),
+        'queries': int(os.getenv('PERFORMANCE_BUDGET_QUERIES', default='20')),
+        'duplicates': int(
+            os.getenv('PERFORMANCE_BUDGET_DUPLICATES', default='3')),
+    },
+}
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
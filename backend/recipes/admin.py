@@ -1,6 +1,9 @@
 from django.contrib.admin import ModelAdmin, register
 
-from .models import Cart, Favorite, Ingredient, IngredientAmount, Recipe, Tag
+from .models import (
+    RECIPE_COUNTERS, Cart, Favorite, Ingredient, IngredientAmount,
+    MeasurementUnit, Recipe, Tag
+)
 
 
 @register(Tag)
@@ -12,16 +15,24 @@ class TagAdmin(ModelAdmin):
 class IngredientAdmin(ModelAdmin):
     list_display = ('name', 'measurement_unit')
     list_filter = ('name',)
+    search_fields = ('name',)
+
+
+@register(MeasurementUnit)
+class MeasurementUnitAdmin(ModelAdmin):
+    list_display = ('name', 'base_unit', 'factor')
+    search_fields = ('name', 'base_unit')
 
 
 @register(Recipe)
 class RecipeAdmin(ModelAdmin):
     list_display = ('name', 'author')
     list_filter = ('author', 'name', 'tags')
+    exclude = RECIPE_COUNTERS
     readonly_fields = ('count_favorites',)
 
     def count_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
     count_favorites.short_description = 'Число добавлений в избранное'
 
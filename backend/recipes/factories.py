@@ -0,0 +1,94 @@
+import factory
+from django.utils import timezone
+
+from users.factories import UserFactory
+from .models import (
+    Cart, Favorite, Ingredient, IngredientAmount, Recipe, Tag
+)
+
+# Файл изображения, общий для всех сгенерированных рецептов.
+FAKE_IMAGE = 'recipe_images/fake.png'
+MEASUREMENT_UNITS = ('г', 'мл', 'шт.', 'ст. л.', 'ч. л.')
+
+
+class TagFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Tag
+        django_get_or_create = ('slug',)
+
+    name = factory.Sequence(lambda number: f'Тег {number}')
+    color = factory.Sequence(lambda number: f'#{number:06X}')
+    slug = factory.Sequence(lambda number: f'tag{number}')
+
+
+class IngredientFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Ingredient
+        django_get_or_create = ('name', 'measurement_unit')
+
+    name = factory.Sequence(lambda number: f'ингредиент {number}')
+    measurement_unit = factory.Iterator(MEASUREMENT_UNITS)
+
+
+class RecipeFactory(factory.django.DjangoModelFactory):
+    """Рецепт с уже готовыми копиями изображения.
+
+    Копии указывают на сам FAKE_IMAGE, поэтому create_renditions не
+    пытается их создать.
+    """
+
+    class Meta:
+        model = Recipe
+
+    class Params:
+        title = factory.Faker('sentence', nb_words=3, locale='ru_RU')
+
+    author = factory.SubFactory(UserFactory)
+    name = factory.LazyAttribute(lambda recipe: recipe.title.rstrip('.'))
+    text = factory.Faker('paragraph', nb_sentences=4, locale='ru_RU')
+    cooking_time = factory.Faker('pyint', min_value=5, max_value=180)
+    image = FAKE_IMAGE
+    thumbnail = FAKE_IMAGE
+    medium = FAKE_IMAGE
+    renditions_source = FAKE_IMAGE
+    pub_date = factory.Faker(
+        'date_time_between', start_date='-1y', tzinfo=timezone.utc)
+
+    @classmethod
+    def _create(cls, model_class, *args, **kwargs):
+        # save() заменяет pub_date текущим временем из-за auto_now_add.
+        pub_date = kwargs.pop('pub_date')
+        recipe = super()._create(model_class, *args, **kwargs)
+        model_class.objects.filter(pk=recipe.pk).update(pub_date=pub_date)
+        recipe.pub_date = pub_date
+        return recipe
+
+    @factory.post_generation
+    def tags(self, create, extracted, **kwargs):
+        if create and extracted:
+            self.tags.set(extracted)
+
+
+class IngredientAmountFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = IngredientAmount
+
+    recipe = factory.SubFactory(RecipeFactory)
+    ingredients = factory.SubFactory(IngredientFactory)
+    amount = factory.Faker('pyint', min_value=1, max_value=500)
+
+
+class FavoriteFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Favorite
+
+    user = factory.SubFactory(UserFactory)
+    recipe = factory.SubFactory(RecipeFactory)
+
+
+class CartFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Cart
+
+    user = factory.SubFactory(UserFactory)
+    recipe = factory.SubFactory(RecipeFactory)
@@ -0,0 +1,91 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumbnail': 320,
+    'medium': 800,
+}
+RENDITIONS_DIR = 'recipe_images/renditions'
+RENDITION_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='images')
+
+
+def content_hash(content):
+    return sha256(content).hexdigest()
+
+
+def render(image, size):
+    rendition = image.copy()
+    rendition.thumbnail((size, size))
+    buffer = BytesIO()
+    rendition.save(buffer, RENDITION_FORMAT, quality=80)
+    return buffer.getvalue()
+
+
+def create_renditions(recipe_id):
+    """Создаёт уменьшенные копии изображения рецепта.
+
+    Копии именуются по хешу содержимого оригинала, поэтому повторная
+    загрузка того же изображения не создаёт новых файлов.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    try:
+        with recipe.image.open('rb') as file:
+            content = file.read()
+    except FileNotFoundError:
+        logger.warning('Нет файла изображения %s', recipe.image.name)
+        return
+    digest = content_hash(content)
+    image = ImageOps.exif_transpose(Image.open(BytesIO(content)))
+    image = image.convert('RGBA' if RENDITION_FORMAT == 'WEBP' else 'RGB')
+    paths = {}
+    for name, size in RENDITIONS.items():
+        path = (f'{RENDITIONS_DIR}/{digest}_{size}.'
+                f'{RENDITION_FORMAT.lower()}')
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(render(image, size)))
+        paths[name] = path
+    Recipe.objects.filter(pk=recipe_id, image=recipe.image.name).update(
+        renditions_source=recipe.image.name,
+        updated=timezone.now(),
+        **paths,
+    )
+
+
+def create_renditions_in_worker(recipe_id):
+    try:
+        create_renditions(recipe_id)
+    except Exception:
+        logger.exception('Ошибка обработки изображения рецепта %s',
+                         recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(recipe_id):
+    """Запускает обработку изображения после фиксации транзакции.
+
+    При IMAGE_PROCESSING_ASYNC = False обработка выполняется сразу
+    в текущем потоке (используется в тестах и замерах).
+    """
+    if settings.IMAGE_PROCESSING_ASYNC:
+        transaction.on_commit(
+            lambda: executor.submit(create_renditions_in_worker, recipe_id))
+    else:
+        transaction.on_commit(lambda: create_renditions(recipe_id))
@@ -0,0 +1,121 @@
+import heapq
+from collections import defaultdict
+from itertools import groupby, islice
+from math import sqrt
+from operator import itemgetter
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import Cart, Favorite, SimilarRecipe
+
+DEFAULT_TOP_K = 20
+DEFAULT_MAX_USER_ITEMS = 500
+DEFAULT_BATCH_SIZE = 1000
+# Добавление в корзину — более слабый сигнал, чем избранное.
+WEIGHTS = ((Favorite, 1.0), (Cart, 0.5))
+
+
+def read_user_items():
+    """Пары (пользователь, {рецепт: вес}) по избранному и корзинам.
+
+    Обе таблицы читаются курсором, отсортированными по пользователю, и
+    сливаются, поэтому в памяти держатся только рецепты одного
+    пользователя.
+    """
+    streams = [
+        ((user, recipe, weight) for user, recipe in model.objects.order_by(
+            'user_id').values_list('user_id', 'recipe_id').iterator())
+        for model, weight in WEIGHTS
+    ]
+    rows = heapq.merge(*streams, key=itemgetter(0))
+    for user, group in groupby(rows, key=itemgetter(0)):
+        items = {}
+        for _, recipe, weight in group:
+            items[recipe] = max(items.get(recipe, 0), weight)
+        yield user, items
+
+
+def build_similarities(user_items, top_k, max_user_items):
+    """Косинусное сходство рецептов по совместным добавлениям.
+
+    Матрица совместной встречаемости хранится разреженно: только пары
+    рецептов, которые хотя бы раз добавил один пользователь.
+    """
+    norms = defaultdict(float)
+    cooccurrence = defaultdict(lambda: defaultdict(float))
+    skipped = 0
+    for _, items in user_items:
+        if len(items) > max_user_items:
+            skipped += 1
+            continue
+        items = sorted(items.items())
+        for index, (recipe, weight) in enumerate(items):
+            norms[recipe] += weight * weight
+            for other, other_weight in items[index + 1:]:
+                product = weight * other_weight
+                cooccurrence[recipe][other] += product
+                cooccurrence[other][recipe] += product
+    neighbours = {
+        recipe: heapq.nlargest(
+            top_k,
+            ((other, value / sqrt(norms[recipe] * norms[other]))
+             for other, value in row.items()),
+            key=itemgetter(1),
+        )
+        for recipe, row in cooccurrence.items()
+    }
+    return neighbours, skipped
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит таблицу похожих рецептов по избранному и корзинам '
+        'пользователей для эндпоинта рекомендаций.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k', type=int, default=DEFAULT_TOP_K,
+            help='Сколько похожих рецептов хранить для каждого рецепта.',
+        )
+        parser.add_argument(
+            '--max-user-items', type=int, default=DEFAULT_MAX_USER_ITEMS,
+            help='Пользователи с большим числом рецептов не учитываются.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Количество строк в одной вставке.',
+        )
+
+    def handle(self, *args, **options):
+        for option in ('top_k', 'max_user_items', 'batch_size'):
+            if options[option] < 1:
+                raise CommandError(
+                    f'--{option.replace("_", "-")} должен быть больше нуля')
+
+        started = perf_counter()
+        neighbours, skipped = build_similarities(
+            read_user_items(), options['top_k'], options['max_user_items']
+        )
+        rows = (
+            SimilarRecipe(recipe_id=recipe, similar_id=other, score=score)
+            for recipe, similar in neighbours.items()
+            for other, score in similar
+        )
+        total = 0
+        with transaction.atomic():
+            SimilarRecipe.objects.all().delete()
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                SimilarRecipe.objects.bulk_create(batch)
+                total += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f' Рецептов с соседями: {len(neighbours)}, '
+            f'записано пар: {total}, '
+            f'пропущено пользователей: {skipped} '
+            f'({perf_counter() - started:.2f} с)'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from recipes.images import create_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии изображений рецептов, где их нет.'
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(
+            renditions_source=F('image')
+        ).values_list('pk', flat=True)
+        count = 0
+        for recipe_id in recipes.iterator():
+            create_renditions(recipe_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f' Обработано изображений рецептов: {count}'))
@@ -1,31 +1,98 @@
 import csv
-import logging
+import json
 import os
+from itertools import islice
+from time import perf_counter
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from recipes.models import Ingredient
+from recipes.signals import link_units
 
-logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
+DEFAULT_BATCH_SIZE = 1000
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8') as file:
+        for row in csv.reader(file):
+            if row:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        for item in json.load(file):
+            yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
 
 
 class Command(BaseCommand):
-    def handle(self, *args, **options):
-        Ingredient.objects.all().delete()
-        logging.info(' Модель Ingredient базы данных очищена.')
+    help = (
+        'Загружает ингредиенты из CSV или JSON. Уже существующие '
+        'ингредиенты пропускаются, поэтому команду можно запускать повторно.'
+    )
+
+    def add_arguments(self, parser):
         base_parent_dir = os.path.abspath(
             os.path.join(settings.BASE_DIR, os.pardir)
         )
-        ingredients = os.path.join(base_parent_dir, 'data', 'ingredients.csv')
-        with open(ingredients, encoding='utf-8') as file:
-            reader = csv.reader(file)
-            counter = 0
-            for row in reader:
-                if counter % 100 == 0:
-                    logging.info(f' Добавлен ингридиент {row[0]}')
-                Ingredient.objects.create(name=row[0], measurement_unit=row[1])
-                counter += 1
-        logging.info(
-            f' В базу данных успешно добавлены ингредиенты - {counter} шт.'
+        parser.add_argument(
+            '--path',
+            default=os.path.join(base_parent_dir, 'data', 'ingredients.csv'),
+            help='Путь к файлу .csv или .json с ингредиентами.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Количество строк в одной вставке.',
         )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Выполнить импорт и откатить транзакцию.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        batch_size = options['batch_size']
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json')
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+
+        started = perf_counter()
+        rows = reader(path)
+        total = 0
+        with transaction.atomic():
+            before = Ingredient.objects.count()
+            while True:
+                batch = [
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in islice(rows, batch_size)
+                ]
+                if not batch:
+                    break
+                Ingredient.objects.bulk_create(
+                    batch, batch_size=batch_size, ignore_conflicts=True
+                )
+                total += len(batch)
+                self.stdout.write(f' Обработано строк: {total}')
+            created = Ingredient.objects.count() - before
+            link_units(Ingredient.objects.filter(unit__isnull=True))
+            if options['dry_run']:
+                transaction.set_rollback(True)
+
+        elapsed = perf_counter() - started
+        rate = total / elapsed if elapsed else total
+        self.stdout.write(self.style.SUCCESS(
+            f' Прочитано строк: {total}, добавлено ингредиентов: {created}, '
+            f'пропущено: {total - created} '
+            f'({elapsed:.2f} с, {rate:.0f} строк/с)'
+            + (' [dry-run, изменения отменены]' if options['dry_run'] else '')
+        ))
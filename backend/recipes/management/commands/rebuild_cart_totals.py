@@ -0,0 +1,48 @@
+from itertools import islice
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import CartIngredientTotal
+from recipes.signals import cart_amounts
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересоздаёт суммы ингредиентов в корзинах пользователей. Нужна '
+        'после массовых операций с корзинами, минующих сигналы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Количество строк в одной вставке.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+
+        started = perf_counter()
+        rows = (
+            CartIngredientTotal(
+                user_id=row['user'], ingredient_id=row['ingredients'],
+                amount=row['total'])
+            for row in cart_amounts().iterator()
+        )
+        total = 0
+        with transaction.atomic():
+            CartIngredientTotal.objects.all().delete()
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                CartIngredientTotal.objects.bulk_create(batch)
+                total += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f' Записано сумм ингредиентов: {total} '
+            f'({perf_counter() - started:.2f} с)'
+        ))
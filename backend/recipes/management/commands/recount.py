@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Cart, Favorite, Recipe
+from recipes.signals import count_subquery
+from users.models import Follow, UserStats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики рецептов и пользователей.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = len(UserStats.objects.bulk_create(
+                [UserStats(user_id=pk) for pk in User.objects.filter(
+                    stats__isnull=True).values_list('pk', flat=True)],
+            ))
+            recipes = Recipe.objects.update(
+                favorites_count=count_subquery(Favorite, 'recipe', 'pk'),
+                in_carts_count=count_subquery(Cart, 'recipe', 'pk'),
+            )
+            users = UserStats.objects.update(
+                recipes_count=count_subquery(Recipe, 'author', 'user'),
+                followers_count=count_subquery(Follow, 'author', 'user'),
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f' Пересчитаны счётчики рецептов: {recipes}, '
+            f'пользователей: {users} (создано записей: {created})'
+        ))
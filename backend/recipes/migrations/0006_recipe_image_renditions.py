@@ -0,0 +1,28 @@
+# Generated by Django 3.2.11 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='medium',
+            field=models.ImageField(blank=True, editable=False, upload_to='', verbose_name='Среднее изображение'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='renditions_source',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Изображение, из которого сделаны копии'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='', verbose_name='Миниатюра'),
+        ),
+    ]
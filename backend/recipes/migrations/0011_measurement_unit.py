@@ -0,0 +1,59 @@
+# Generated by Django 3.2.11 on 2026-10-18 18:48
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+# (единица, базовая единица, множитель) для единиц из data/ingredients.csv,
+# которые можно перевести друг в друга. Стакан — гранёный, 200 мл.
+UNITS = (
+    ('г', 'г', 1),
+    ('кг', 'г', 1000),
+    ('мл', 'мл', 1),
+    ('л', 'мл', 1000),
+    ('ч. л.', 'мл', 5),
+    ('ст. л.', 'мл', 15),
+    ('стакан', 'мл', 200),
+)
+
+
+def create_units(apps, schema_editor):
+    MeasurementUnit = apps.get_model('recipes', 'MeasurementUnit')
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    MeasurementUnit.objects.bulk_create([
+        MeasurementUnit(name=name, base_unit=base_unit, factor=factor)
+        for name, base_unit, factor in UNITS
+    ])
+    Ingredient.objects.update(unit=Subquery(MeasurementUnit.objects.filter(
+        name=OuterRef('measurement_unit')).values('pk')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_cart_ingredient_total'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeasurementUnit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20, unique=True, verbose_name='Название')),
+                ('base_unit', models.CharField(max_length=20, verbose_name='Базовая единица')),
+                ('factor', models.FloatField(validators=[django.core.validators.MinValueValidator(0.001, message='Множитель должен быть больше нуля')], verbose_name='Множитель')),
+            ],
+            options={
+                'verbose_name': 'Единица измерения',
+                'verbose_name_plural': 'Единицы измерения',
+                'ordering': ['base_unit', 'factor'],
+            },
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='unit',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingredients', to='recipes.measurementunit', verbose_name='Единица для пересчёта'),
+        ),
+        migrations.RunPython(create_units, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,14 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
 from django.db import models
+from django.db.models import F, Q
 
 User = get_user_model()
 
+# Счётчики рецепта меняются только запросами с F() из recipes.signals.
+RECIPE_COUNTERS = ('favorites_count', 'in_carts_count')
+
 
 class Tag(models.Model):
     name = models.CharField(
@@ -22,16 +27,52 @@ class Tag(models.Model):
         return self.name
 
 
+class MeasurementUnit(models.Model):
+    """Перевод единицы измерения в базовую.
+
+    Количество 1 name равно factor base_unit. Для самой базовой единицы
+    base_unit совпадает с name, а factor равен 1.
+    """
+    name = models.CharField(
+        verbose_name='Название', max_length=20, unique=True)
+    base_unit = models.CharField(
+        verbose_name='Базовая единица', max_length=20)
+    factor = models.FloatField(
+        verbose_name='Множитель',
+        validators=[validators.MinValueValidator(
+            0.001, message='Множитель должен быть больше нуля')],
+    )
+
+    class Meta:
+        verbose_name = 'Единица измерения'
+        verbose_name_plural = 'Единицы измерения'
+        ordering = ['base_unit', 'factor']
+
+    def __str__(self):
+        return f'{self.name} = {self.factor:g} {self.base_unit}'
+
+
 class Ingredient(models.Model):
     name = models.CharField(
         verbose_name='Название', max_length=200)
     measurement_unit = models.CharField(
         verbose_name='Единицы измерения', max_length=20)
+    unit = models.ForeignKey(
+        MeasurementUnit,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='ingredients',
+        verbose_name='Единица для пересчёта',
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
+        # Индекс уникальности начинается с name и обслуживает сортировку
+        # и поиск по названию, отдельный индекс по name не нужен.
         constraints = [
             models.UniqueConstraint(
                 fields=['name', 'measurement_unit'],
@@ -48,6 +89,7 @@ class Recipe(models.Model):
         User,
         on_delete=models.CASCADE,
         null=True,
+        db_index=False,
         related_name='recipes',
         verbose_name='Автор публикации',
     )
@@ -55,6 +97,13 @@ class Recipe(models.Model):
         verbose_name='Название', max_length=200)
     image = models.ImageField(
         verbose_name='Изображение', upload_to='recipe_images/')
+    thumbnail = models.ImageField(
+        verbose_name='Миниатюра', blank=True, editable=False)
+    medium = models.ImageField(
+        verbose_name='Среднее изображение', blank=True, editable=False)
+    renditions_source = models.CharField(
+        verbose_name='Изображение, из которого сделаны копии',
+        max_length=100, blank=True, editable=False)
     text = models.TextField(
         verbose_name='Текстовое описание')
     ingredients = models.ManyToManyField(
@@ -73,20 +122,56 @@ class Recipe(models.Model):
     )
     pub_date = models.DateTimeField(
         verbose_name='Дата публикации', auto_now_add=True)
+    updated = models.DateTimeField(
+        verbose_name='Дата изменения', auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Число добавлений в избранное', default=0)
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='Число добавлений в корзину', default=0)
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date', )
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date', '-id'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['id'], name='recipe_renditions_pending_idx',
+                condition=~Q(renditions_source=F('image')),
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name}'
 
+    def save(self, *args, **kwargs):
+        # Полное сохранение загруженного ранее рецепта не должно затирать
+        # счётчики, которые успели измениться в базе.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in RECIPE_COUNTERS
+            ]
+        super().save(*args, **kwargs)
+
 
 class IngredientAmount(models.Model):
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='ingredient',
         verbose_name='В каких рецептах',
     )
@@ -125,6 +210,7 @@ class Cart(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='cart',
         verbose_name='Пользователь',
     )
@@ -154,6 +240,7 @@ class Favorite(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='favorites',
         verbose_name='Пользователь',
     )
@@ -177,3 +264,80 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f'{self.user}'
+
+
+class SimilarRecipe(models.Model):
+    """Ближайший сосед рецепта по совместным добавлениям.
+
+    Таблица заполняется командой build_recommendations.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='similar',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='+',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        ordering = ['recipe', '-score']
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['similar', 'recipe'], name='similar_recipe_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} → {self.similar}'
+
+
+class CartIngredientTotal(models.Model):
+    """Сумма ингредиента по всем рецептам в корзине пользователя.
+
+    Таблица поддерживается функцией refresh_cart_totals при изменении
+    корзины и ингредиентов рецептов, а целиком пересоздаётся командой
+    rebuild_cart_totals.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='cart_totals',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент',
+    )
+    amount = models.FloatField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Ингредиент в корзине'
+        verbose_name_plural = 'Ингредиенты в корзинах'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_ingredient_total'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
@@ -0,0 +1,194 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from users.models import UserStats
+from .images import schedule_renditions
+from .models import (
+    Cart, CartIngredientTotal, Favorite, Ingredient, IngredientAmount,
+    MeasurementUnit, Recipe
+)
+from .transactions import CommitBatch
+
+User = get_user_model()
+
+COUNTERS = {
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    Cart: (Recipe, 'recipe_id', 'in_carts_count'),
+    Recipe: (UserStats, 'author_id', 'recipes_count'),
+}
+
+
+def count_subquery(model, field, outer_field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef(outer_field)}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
+def recount(model, pks):
+    """Пересчитывает счётчик после массовых операций, минующих сигналы."""
+    counted, attr, field = COUNTERS[model]
+    counted.objects.filter(pk__in=pks).update(
+        **{field: count_subquery(model, attr[:-len('_id')], 'pk')}
+    )
+
+
+def cart_amounts(users=None):
+    """Суммы ингредиентов по корзинам из исходных таблиц.
+
+    Без users считаются корзины всех пользователей.
+    """
+    if users is None:
+        amounts = IngredientAmount.objects.filter(recipe__cart__isnull=False)
+    else:
+        amounts = IngredientAmount.objects.filter(
+            recipe__cart__user__in=users)
+    return amounts.order_by().values(
+        'ingredients', user=F('recipe__cart__user')
+    ).annotate(total=Sum('amount'))
+
+
+def refresh_cart_totals(users, ingredients=None):
+    """Пересчитывает CartIngredientTotal пользователей.
+
+    users и ingredients — списки id или подзапросы. Если ingredients
+    переданы, пересчитываются только эти ингредиенты, иначе корзина
+    целиком. Суммы берутся из исходных таблиц, а не корректируются на
+    разницу, поэтому ошибки округления не накапливаются. Строки
+    пользователей блокируются, чтобы параллельные изменения одной
+    корзины не перезаписали результат друг друга.
+    """
+    with transaction.atomic(savepoint=False):
+        users = list(User.objects.select_for_update(no_key=True).filter(
+            pk__in=users).order_by('pk').values_list('pk', flat=True))
+        if not users:
+            return
+        totals = CartIngredientTotal.objects.filter(user__in=users)
+        amounts = cart_amounts(users)
+        if ingredients is not None:
+            totals = totals.filter(ingredient__in=ingredients)
+            amounts = amounts.filter(ingredients__in=ingredients)
+        totals.delete()
+        CartIngredientTotal.objects.bulk_create([
+            CartIngredientTotal(
+                user_id=row['user'], ingredient_id=row['ingredients'],
+                amount=row['total'])
+            for row in amounts
+        ])
+
+
+def _refresh_carts(recipe_ids, user_ids):
+    if recipe_ids:
+        user_ids.update(Cart.objects.filter(
+            recipe__in=recipe_ids).values_list('user', flat=True))
+    if user_ids:
+        refresh_cart_totals(user_ids)
+
+
+cart_refresh = CommitBatch(_refresh_carts, 'recipe_ids', 'user_ids')
+
+
+def schedule_cart_refresh(recipe_ids=(), user_ids=()):
+    """После commit пересчитывает корзины пользователей целиком.
+
+    Пересчитываются корзины user_ids и корзины, в которых лежат рецепты
+    recipe_ids. При удалении рецепта строки его состава удаляются по
+    одной, и так корзины пересчитываются один раз, а не на каждую строку.
+    """
+    cart_refresh.add(recipe_ids=recipe_ids, user_ids=user_ids)
+
+
+def recipe_ingredients(recipes):
+    return IngredientAmount.objects.filter(
+        recipe__in=recipes).values('ingredients')
+
+
+def link_units(queryset=None):
+    """Связывает ингредиенты с единицами для пересчёта по measurement_unit.
+
+    Нужна после массовой вставки ингредиентов, минующей сигналы.
+    """
+    if queryset is None:
+        queryset = Ingredient.objects.all()
+    return queryset.update(unit=Subquery(MeasurementUnit.objects.filter(
+        name=OuterRef('measurement_unit')).values('pk')[:1]))
+
+
+def update_counter(instance, delta):
+    model, attr, field = COUNTERS[type(instance)]
+    model.objects.filter(pk=getattr(instance, attr)).update(
+        **{field: F(field) + delta}
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Cart)
+@receiver(post_save, sender=Recipe)
+def increment_counter(instance, created, **kwargs):
+    if created:
+        update_counter(instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Cart)
+@receiver(post_delete, sender=Recipe)
+def recount_deleted(instance, **kwargs):
+    # Сигнал приходит и тогда, когда строку уже удалил параллельный
+    # запрос, поэтому счётчик пересчитывается, а не уменьшается.
+    model = type(instance)
+    recount(model, [getattr(instance, COUNTERS[model][1])])
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(instance, **kwargs):
+    if instance.image and instance.renditions_source != instance.image.name:
+        schedule_renditions(instance.pk)
+
+
+@receiver(post_save, sender=Cart)
+def add_cart_totals(instance, created, **kwargs):
+    if created:
+        refresh_cart_totals(
+            [instance.user_id], recipe_ingredients([instance.recipe_id]))
+
+
+@receiver(post_delete, sender=Cart)
+def remove_cart_totals(instance, **kwargs):
+    refresh_cart_totals(
+        [instance.user_id], recipe_ingredients([instance.recipe_id]))
+
+
+@receiver(pre_delete, sender=Recipe)
+def refresh_deleted_recipe_carts(instance, **kwargs):
+    # Корзины и состав удаляемого рецепта удаляются каскадом в
+    # произвольном порядке, поэтому корзины пересчитываются после commit.
+    schedule_cart_refresh(user_ids=Cart.objects.filter(
+        recipe=instance).values_list('user', flat=True))
+
+
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+def amount_cart_totals(instance, **kwargs):
+    schedule_cart_refresh([instance.recipe_id])
+
+
+@receiver(pre_save, sender=Ingredient)
+def set_ingredient_unit(instance, **kwargs):
+    instance.unit = MeasurementUnit.objects.filter(
+        name=instance.measurement_unit).first()
+
+
+@receiver(post_save, sender=MeasurementUnit)
+def link_unit_ingredients(instance, **kwargs):
+    # Единицу могли переименовать, тогда прежние ингредиенты отвязываются.
+    link_units(Ingredient.objects.filter(
+        Q(measurement_unit=instance.name) | Q(unit=instance)))
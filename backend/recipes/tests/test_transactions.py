@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from recipes.transactions import CommitBatch
+
+
+class CommitBatchTest(TestCase):
+    """Обработка накопленных id после commit."""
+
+    def setUp(self):
+        self.calls = []
+        self.batch = CommitBatch(
+            lambda **ids: self.calls.append(ids), 'recipe_ids', 'user_ids')
+
+    def test_ids_are_flushed_once_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batch.add(recipe_ids=[1, 2])
+            self.batch.add(recipe_ids=[2, 3], user_ids=[7])
+            self.assertEqual(self.calls, [])
+        self.assertEqual(
+            self.calls, [{'recipe_ids': {1, 2, 3}, 'user_ids': {7}}])
+
+
+class CommitBatchRollbackTest(TransactionTestCase):
+    """id из откатившейся транзакции не теряются."""
+
+    def test_ids_survive_rollback(self):
+        calls = []
+        batch = CommitBatch(lambda **ids: calls.append(ids), 'recipe_ids')
+        with self.assertRaises(ZeroDivisionError):
+            with transaction.atomic():
+                batch.add(recipe_ids=[1])
+                1 / 0
+        self.assertEqual(calls, [])
+        batch.add(recipe_ids=[2])
+        self.assertEqual(calls, [{'recipe_ids': {1, 2}}])
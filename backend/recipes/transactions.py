@@ -0,0 +1,35 @@
+from threading import local
+
+from django.db import transaction
+
+
+class CommitBatch:
+    """Копит id и обрабатывает их одним вызовом после commit.
+
+    add() запоминает id в наборах с заданными именами и регистрирует
+    обработку через transaction.on_commit. Первая сработавшая после commit
+    обработка забирает всё накопленное и вызывает func(**наборы), остальные
+    ничего не делают. Вне транзакции обработка выполняется сразу.
+
+    Если транзакция откатилась, её id останутся в наборах и будут
+    обработаны после следующего commit в этом потоке. Обработчики
+    пересчитывают данные по текущему состоянию БД, поэтому лишний
+    пересчёт безопасен.
+    """
+
+    def __init__(self, func, *names):
+        self.func = func
+        self.names = names
+        self._pending = local()
+
+    def add(self, **ids):
+        pending = self._pending.__dict__.setdefault(
+            'ids', {name: set() for name in self.names})
+        for name, values in ids.items():
+            pending[name].update(values)
+        transaction.on_commit(self.flush)
+
+    def flush(self):
+        pending = self._pending.__dict__.pop('ids', None)
+        if pending is not None and any(pending.values()):
+            self.func(**pending)
@@ -0,0 +1,36 @@
+from functools import lru_cache
+
+import factory
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from .models import Follow
+
+User = get_user_model()
+
+PASSWORD = 'foodgram-password'
+
+
+@lru_cache(maxsize=None)
+def password_hash():
+    """Хэш общего пароля: считать его для каждого пользователя долго."""
+    return make_password(PASSWORD)
+
+
+class UserFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = User
+
+    username = factory.Sequence(lambda number: f'fake_user{number}')
+    email = factory.LazyAttribute(lambda user: f'{user.username}@example.com')
+    first_name = factory.Faker('first_name', locale='ru_RU')
+    last_name = factory.Faker('last_name', locale='ru_RU')
+    password = factory.LazyFunction(password_hash)
+
+
+class FollowFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Follow
+
+    user = factory.SubFactory(UserFactory)
+    author = factory.SubFactory(UserFactory)
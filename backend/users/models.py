@@ -14,6 +14,7 @@ class Follow(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='follower',
         verbose_name='Подписчик',
     )
@@ -28,6 +29,30 @@ class Follow(models.Model):
                 name='unique_follow',
             )
         ]
+        indexes = [
+            models.Index(fields=['user', '-id'], name='follow_user_id_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user} --> {self.author}'
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Число рецептов', default=0)
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return f'{self.user}'
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.signals import count_subquery
+from .models import Follow, UserStats
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Follow)
+def increment_followers_count(instance, created, **kwargs):
+    if created:
+        UserStats.objects.filter(user=instance.author_id).update(
+            followers_count=F('followers_count') + 1)
+
+
+@receiver(post_delete, sender=Follow)
+def recount_followers(instance, **kwargs):
+    # Подписку мог уже удалить параллельный запрос, поэтому число
+    # подписчиков пересчитывается, а не уменьшается.
+    UserStats.objects.filter(user=instance.author_id).update(
+        followers_count=count_subquery(Follow, 'author', 'user'))